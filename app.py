@@ -1,15 +1,90 @@
 from flask import Flask, request, abort
-from core.security import verify_line_signature
-from features.order_flow import handle_event
+from core.config import WARM_UP_ON_BOOT
+from core.security import verify_line_signature, verify_metrics_token
+from core import rate_limit
+from integrations.line_api import reply_message
 import os
+import threading
+import time
 
 app = Flask(__name__)
 
+# service ต่าง ๆ (gspread / google-auth / Sheets) โหลดแบบ lazy
+# health check ตอบได้ทันทีโดยไม่ต้องรอ Google
+_boot = {"started": time.time(), "ready_seconds": None, "error": None, "steps": {}}
+_warm_lock = threading.Lock()
+_warm_thread = None
+
+# warm up พัง -> รอแล้วลองใหม่เฉพาะ step ที่ยังไม่เสร็จ
+WARM_UP_BACKOFF_SECONDS = [1, 2, 5, 10, 30, 60]
+
+
+def _step(name, fn):
+    # step ที่เสร็จแล้วไม่ทำซ้ำ (replay journal ต้องทำครั้งเดียว)
+    if name in _boot["steps"]:
+        return
+    fn()
+    _boot["steps"][name] = round(time.time() - _boot["started"], 3)
+
+
+def warm_up():
+    """
+    ต่อ Google, ปิดออเดอร์ที่ค้างจาก worker ที่ตาย, เตรียม stats
+    รันใน thread เดียวจนครบทุก step (webhook ไม่ต้องรอ)
+    """
+    attempt = 0
+    while True:
+        try:
+            from services.sheets_service import connect
+            from services.stats_service import ensure_built
+            from features.order_flow import replay_journal
+
+            _step("connect", connect)
+            _step("replay", replay_journal)
+            _step("stats", ensure_built)
+            _boot["ready_seconds"] = round(time.time() - _boot["started"], 3)
+            _boot["error"] = None
+            return
+        except Exception as e:
+            # /metrics แสดงแค่ชนิด error (ข้อความเต็มอาจมี path / credential) -> ข้อความเต็มดูใน log
+            _boot["error"] = type(e).__name__
+            print("warm up error:", e)
+
+        time.sleep(WARM_UP_BACKOFF_SECONDS[min(attempt, len(WARM_UP_BACKOFF_SECONDS) - 1)])
+        attempt += 1
+
+
+def start_warm_up():
+    """
+    เริ่ม warm up ใน background (ถ้ายังไม่เสร็จและยังไม่มี thread ทำอยู่)
+    """
+    global _warm_thread
+    with _warm_lock:
+        if _boot["ready_seconds"] is not None:
+            return
+        if _warm_thread is not None and _warm_thread.is_alive():
+            return
+        _warm_thread = threading.Thread(target=warm_up, name="warm-up", daemon=True)
+        _warm_thread.start()
+
+
+if WARM_UP_ON_BOOT:
+    start_warm_up()
+
 # Health check
 @app.route("/", methods=["GET"])
 def health():
     return {"ok": True, "service": "hardy-shop-bot", "version": "3.2"}
 
+# Metrics
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    if not verify_metrics_token(request.headers.get("Authorization", "")):
+        abort(403)
+
+    from services.sheets_service import quota_stats
+    return {"boot": _boot, "rate_limit": rate_limit.stats(), "sheets": quota_stats()}
+
 # LINE Webhook
 @app.route("/webhook", methods=["POST"])
 def webhook():
@@ -19,11 +94,26 @@ def webhook():
     if not verify_line_signature(body, signature):
         abort(403)
 
+    start_warm_up()
+    from features.order_flow import handle_event
+
     payload = request.get_json(silent=True) or {}
     events = payload.get("events", [])
 
     for ev in events:
-        handle_event(ev)
+        uid = (ev.get("source") or {}).get("userId", "")
+        decision = rate_limit.check(uid)
+
+        if decision == rate_limit.NOTICE and ev.get("replyToken"):
+            reply_message(ev["replyToken"], rate_limit.BUSY_MESSAGES)
+        if decision != rate_limit.ALLOW:
+            continue
+
+        # event ที่พังต้องไม่ทำให้ event อื่นใน batch หาย
+        try:
+            handle_event(ev)
+        except Exception as e:
+            print("handle_event error:", uid, e)
 
     return "OK", 200
 
@@ -28,6 +28,44 @@ DEFAULT_PRICE_THB = int(env("DEFAULT_PRICE_THB", "1290"))
 # Session
 SESSION_TTL_SECONDS = int(env("SESSION_TTL_SECONDS", "1800"))
 
+# Idempotency index (confirm_token -> order_id), JSONL
+IDEMPOTENCY_FILE = env("IDEMPOTENCY_FILE", "data/confirm_tokens.jsonl")
+
+# Write-ahead journal (stock deduction + order), JSONL
+JOURNAL_FILE = env("JOURNAL_FILE", "data/order_journal.jsonl")
+
+# Multi worker / multi node coordination: memory | sqlite | redis
+COORD_BACKEND = env("COORD_BACKEND", "memory").lower()
+COORD_SQLITE_FILE = env("COORD_SQLITE_FILE", "data/coord.db")
+REDIS_URL = env("REDIS_URL", "redis://127.0.0.1:6379/0")
+
+# Stock catalog cache per worker (invalidated on deduct/restore)
+STOCK_CACHE_SECONDS = int(env("STOCK_CACHE_SECONDS", "60"))
+
+# Boot: ต่อ Google / replay journal / stats ใน background หลัง start
+WARM_UP_ON_BOOT = env("WARM_UP_ON_BOOT", "1") == "1"
+
+# GET /metrics ต้องส่ง Authorization: Bearer <METRICS_TOKEN> (ว่าง = ปิด /metrics)
+METRICS_TOKEN = env("METRICS_TOKEN")
+
+# Admin chat relay
+RELAY_BATCH_SECONDS = float(env("RELAY_BATCH_SECONDS", "3"))
+RELAY_CONVERSATION_TTL_SECONDS = int(env("RELAY_CONVERSATION_TTL_SECONDS", str(7 * 24 * 3600)))
+
+# Rate limit (webhook edge, token bucket)
+RATE_USER_PER_SEC = float(env("RATE_USER_PER_SEC", "1"))
+RATE_USER_BURST = int(env("RATE_USER_BURST", "5"))
+RATE_GLOBAL_PER_SEC = float(env("RATE_GLOBAL_PER_SEC", "20"))
+RATE_GLOBAL_BURST = int(env("RATE_GLOBAL_BURST", "40"))
+RATE_MAX_BUCKETS = int(env("RATE_MAX_BUCKETS", "5000"))
+RATE_NOTICE_SECONDS = int(env("RATE_NOTICE_SECONDS", "30"))
+
+# Google Sheets quota (requests / minute / user)
+SHEETS_QUOTA_PER_MIN = int(env("SHEETS_QUOTA_PER_MIN", "60"))
+SHEETS_MAX_WAIT_SECONDS = float(env("SHEETS_MAX_WAIT_SECONDS", "20"))
+SHEETS_MAX_RETRIES = int(env("SHEETS_MAX_RETRIES", "4"))
+SHEETS_REQUEST_TIMEOUT_SECONDS = float(env("SHEETS_REQUEST_TIMEOUT_SECONDS", "15"))
+
 # Worksheets name
 WS_STOCK = env("WS_STOCK", "HARDY_STOCK")
 WS_SESSION = env("WS_SESSION", "HARDY_SESSION")
@@ -0,0 +1,106 @@
+# ==========================================================
+# HARDY RATE LIMIT - WEBHOOK EDGE
+# token bucket ต่อ userId + global
+# - memory only, จำกัดจำนวน bucket (LRU ไล่ bucket ที่ idle)
+# - admin (ADMIN_USER_IDS) ไม่โดนจำกัด
+# ==========================================================
+
+import threading
+import time
+from collections import OrderedDict
+from core.config import (
+    ADMIN_USER_IDS,
+    RATE_USER_PER_SEC,
+    RATE_USER_BURST,
+    RATE_GLOBAL_PER_SEC,
+    RATE_GLOBAL_BURST,
+    RATE_MAX_BUCKETS,
+    RATE_NOTICE_SECONDS,
+)
+
+# ตอบลูกค้าที่ส่งถี่เกิน (สร้างครั้งเดียว ไม่แตะ Sheets)
+BUSY_MESSAGES = [{"type": "text", "text": "ส่งข้อความถี่เกินไป ⏳ รอสักครู่แล้วลองใหม่นะคะ"}]
+
+ALLOW = "ALLOW"
+NOTICE = "NOTICE"   # เกิน limit -> ตอบ BUSY_MESSAGES
+DROP = "DROP"       # เกิน limit -> ทิ้งเงียบ ๆ
+
+_lock = threading.Lock()
+_buckets = OrderedDict()   # uid -> [tokens, last_ts, last_notice_ts]
+_global = [float(RATE_GLOBAL_BURST), time.monotonic()]
+
+counters = {
+    "allowed": 0,
+    "shed_user": 0,
+    "shed_global": 0,
+    "notices": 0,
+    "evicted_buckets": 0,
+}
+
+
+def _refill(tokens, last, now, rate, burst):
+    return min(float(burst), tokens + (now - last) * rate)
+
+
+def _take_global(now):
+    tokens = _refill(_global[0], _global[1], now, RATE_GLOBAL_PER_SEC, RATE_GLOBAL_BURST)
+    _global[1] = now
+    if tokens < 1:
+        _global[0] = tokens
+        return False
+    _global[0] = tokens - 1
+    return True
+
+
+def _user_bucket(uid, now):
+    b = _buckets.get(uid)
+    if b is None:
+        b = [float(RATE_USER_BURST), now, 0.0]
+        _buckets[uid] = b
+        while len(_buckets) > RATE_MAX_BUCKETS:
+            _buckets.popitem(last=False)
+            counters["evicted_buckets"] += 1
+    else:
+        _buckets.move_to_end(uid)
+    return b
+
+
+def _shed(b, now, key):
+    counters[key] += 1
+    if now - b[2] >= RATE_NOTICE_SECONDS:
+        b[2] = now
+        counters["notices"] += 1
+        return NOTICE
+    return DROP
+
+
+def check(uid):
+    """
+    ALLOW / NOTICE / DROP สำหรับ event ของ uid
+    """
+    if uid and uid in ADMIN_USER_IDS:
+        with _lock:
+            counters["allowed"] += 1
+        return ALLOW
+
+    now = time.monotonic()
+
+    with _lock:
+        b = _user_bucket(uid or "", now)
+        b[0] = _refill(b[0], b[1], now, RATE_USER_PER_SEC, RATE_USER_BURST)
+        b[1] = now
+
+        if b[0] < 1:
+            return _shed(b, now, "shed_user")
+
+        if not _take_global(now):
+            return _shed(b, now, "shed_global")
+
+        b[0] -= 1
+        counters["allowed"] += 1
+        return ALLOW
+
+
+def stats():
+    with _lock:
+        return {**counters, "buckets": len(_buckets)}
@@ -1,19 +1,31 @@
 import base64
 import hmac
 import hashlib
-from core.config import LINE_CHANNEL_SECRET
+from core.config import LINE_CHANNEL_SECRET, METRICS_TOKEN
+
+def sign_body(body: str, secret: str = LINE_CHANNEL_SECRET) -> str:
+    # X-Line-Signature = base64(HMAC-SHA256(channel secret, body))
+    mac = hmac.new(
+        secret.encode("utf-8"),
+        body.encode("utf-8"),
+        hashlib.sha256
+    ).digest()
+    return base64.b64encode(mac).decode("utf-8")
 
 def verify_line_signature(body: str, signature: str) -> bool:
     if not LINE_CHANNEL_SECRET:
         # If not configured, fail safe
         return False
 
-    mac = hmac.new(
-        LINE_CHANNEL_SECRET.encode("utf-8"),
-        body.encode("utf-8"),
-        hashlib.sha256
-    ).digest()
-    expected = base64.b64encode(mac).decode("utf-8")
+    expected = sign_body(body)
 
     # constant-time compare
     return hmac.compare_digest(expected, signature or "")
+
+def verify_metrics_token(authorization: str) -> bool:
+    if not METRICS_TOKEN:
+        # not configured -> /metrics disabled
+        return False
+
+    # constant-time compare
+    return hmac.compare_digest(f"Bearer {METRICS_TOKEN}".encode("utf-8"), (authorization or "").encode("utf-8"))
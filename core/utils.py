@@ -1,5 +1,8 @@
 from __future__ import annotations
+from contextlib import contextmanager
 from datetime import datetime, timezone, timedelta
+import fcntl
+import os
 import uuid
 import re
 
@@ -24,6 +27,19 @@ def safe_int(s: str, default: int = 0) -> int:
 def clamp(n: int, lo: int, hi: int) -> int:
     return max(lo, min(hi, n))
 
+@contextmanager
+def file_lock(path: str):
+    # lock ข้าม process บนเครื่องเดียว (flock ที่ไฟล์ <path>.lock)
+    folder = os.path.dirname(path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    with open(path + ".lock", "a") as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
 def shorten_label(label: str, max_len: int = 20) -> str:
     label = re.sub(r"\s+", " ", (label or "").strip())
     return label[:max_len] if len(label) > max_len else label
@@ -2,6 +2,7 @@
 # HARDY ORDER FLOW - CLEAN FINAL VERSION
 # ==========================================================
 
+import threading
 from integrations.line_api import reply_message
 from services.stock_service import (
     get_available_colors,
@@ -9,16 +10,35 @@ from services.stock_service import (
     get_stock,
     get_price,
     deduct_stock,
+    settle_stock,
+    StockWriteUnknown,
 )
 from services.session_service import get_session, set_session, clear_session
-from services.order_service import create_order
+from services.order_service import create_order, get_order
+from services.idempotency_service import (
+    lookup_order,
+    claim,
+    release,
+    hold,
+    held,
+    record_order,
+)
+from services import journal_service as journal
+from services import stats_service
+from services import coord_service as coord
 from services.admin_service import (
     notify_admin_context,
     forward_to_admin,
     is_admin_uid,
     admin_close_order,
+    open_conversation,
+    handle_admin_relay,
 )
-from core.utils import safe_int, gen_token
+from services.sheets_service import SheetsBusyError, call_budget_seconds
+from core.utils import safe_int, gen_token, gen_order_id
+
+# Sheets quota เต็ม -> ตอบข้อความนี้ (สร้างครั้งเดียว ไม่แตะ Sheets)
+BUSY_MESSAGES = [{"type": "text", "text": "ระบบมีผู้ใช้งานจำนวนมาก ⏳ กรุณาลองใหม่อีกครั้งในสักครู่นะคะ"}]
 
 
 # ----------------------------------------------------------
@@ -70,6 +90,33 @@ def send_menu(reply_token):
     )
 
 
+def send_order_done(reply_token, order_id):
+    reply_message(
+        reply_token,
+        [
+            quick(
+                f"รับออเดอร์แล้ว ✅\nORDER ID: {order_id}",
+                [],
+                include_admin=True,
+                include_menu=True,
+            )
+        ],
+    )
+
+
+def send_confirm_retry(reply_token, token):
+    # token ถูก hold ไว้ -> กดปุ่มเดิมซ้ำแล้วระบบทำต่อจากจุดที่ค้าง (ไม่ตัดสต๊อกซ้ำ)
+    reply_message(
+        reply_token,
+        [
+            quick(
+                "ระบบยังบันทึกคำสั่งซื้อไม่เสร็จ ⏳\nกรุณากดยืนยันอีกครั้งในสักครู่นะคะ",
+                [("✅ ยืนยันคำสั่งซื้อ", f"BOT:FINAL_CONFIRM:{token}")],
+            )
+        ],
+    )
+
+
 def parse_payload(text):
     if not text.startswith("BOT:"):
         return None, []
@@ -84,6 +131,33 @@ def parse_payload(text):
 def handle(uid, reply_token, text):
 
     text = text.strip()
+
+    # ------------------------------------------------------
+    # REPEAT CONFIRM (double tap / redelivery) -> no backend
+    # ------------------------------------------------------
+    if text.startswith("BOT:FINAL_CONFIRM:"):
+        order_id = lookup_order(text.split(":", 2)[2])
+        if order_id:
+            send_order_done(reply_token, order_id)
+            return
+
+    # ------------------------------------------------------
+    # ADMIN STATS (ก่อนอ่าน session -> ไม่แตะ Sheets ยกเว้น REBUILD)
+    # STATS:TODAY / STATS:WEEK / STATS:SKU:<color>/<size> / STATS:DAY:YYYY-MM-DD / STATS:REBUILD
+    # ------------------------------------------------------
+    if is_admin_uid(uid) and text.upper().startswith("STATS:"):
+        reply_message(reply_token, [{"type": "text", "text": admin_stats(text)}])
+        return
+
+    # ------------------------------------------------------
+    # ADMIN RELAY (#<id> ข้อความ / CLAIM:<id> / RELEASE:<id>)
+    # ------------------------------------------------------
+    if is_admin_uid(uid):
+        relay_reply = handle_admin_relay(uid, text)
+        if relay_reply:
+            reply_message(reply_token, [{"type": "text", "text": relay_reply}])
+            return
+
     session = get_session(uid) or {}
     state = session.get("state", "IDLE")
     data = session.get("data", {}) or {}
@@ -124,7 +198,7 @@ def handle(uid, reply_token, text):
         context = data.copy()
         clear_session(uid)
 
-        notify_admin_context(uid, context)
+        notify_admin_context(uid, {**context, "conv_id": open_conversation(uid)})
         set_session(uid, "ADMIN_CHAT", {})
 
         reply_message(
@@ -280,44 +354,219 @@ def handle(uid, reply_token, text):
                     f"📦 ตรวจสอบก่อนยืนยัน\n{data['color']} / {data['size']}\n"
                     f"{data['qty']} ตัว\nรวม {data['total']} บาท\n\n"
                     f"{data['name']}\n{data['phone']}\n{data['address']}",
-                    [("✅ ยืนยันคำสั่งซื้อ", "BOT:FINAL_CONFIRM")],
+                    [("✅ ยืนยันคำสั่งซื้อ", f"BOT:FINAL_CONFIRM:{data['confirm_token']}")],
                 )
             ],
         )
         return
 
-    if cmd == "BOT" and parts == ["FINAL_CONFIRM"]:
+    if cmd == "BOT" and parts[:1] == ["FINAL_CONFIRM"]:
         if state != "WAIT_FINAL_CONFIRM":
             send_menu(reply_token)
             return
 
-        ok, remain = deduct_stock(data["color"], data["size"], data["qty"])
+        token = data.get("confirm_token", "")
+        # ปุ่มจากรอบก่อน (token ไม่ตรง session ปัจจุบัน)
+        if len(parts) > 1 and parts[1] != token:
+            send_menu(reply_token)
+            return
+
+        # worker ที่ตายไปอาจค้าง token นี้ไว้ใน journal (replay ยังไม่ถึง / claim หมดอายุ)
+        # -> adopt ก่อนจอง จะได้ hold ไว้ ไม่ตัดสต๊อกซ้ำ
+        _adopt(token)
+
+        if not claim(token):
+            # รอบก่อนพังกลางทาง (hold) -> ทำต่อให้จบ / ยกเลิกแล้วเริ่มใหม่
+            order_id = lookup_order(token) or _resume(token)
+            if order_id:
+                clear_session(uid)
+                send_order_done(reply_token, order_id)
+                return
+            if not claim(token):
+                reply_message(reply_token, [{"type": "text", "text": "กำลังดำเนินการคำสั่งซื้อ ⏳"}])
+                return
+
+        order_id = gen_order_id()
+        entry = {"id": token, "uid": uid, "order_id": order_id, "data": data, "write": None, "stock_done": False}
+
+        def on_write(row, before, after):
+            # journal ก่อนเรียก update -> replay ถามผลจาก settle_stock ได้
+            entry["write"] = {"row": row, "before": before, "after": after}
+            journal.write(token, row, before, after)
+
+        try:
+            journal.begin(token, uid, order_id, data)
+            ok, remain = deduct_stock(data["color"], data["size"], data["qty"], token, on_write)
+        except StockWriteUnknown as ex:
+            # ไม่รู้ว่าตัดลงชีตหรือยัง -> ห้ามปล่อย token ให้ตัดซ้ำ
+            hold(token, entry)
+            print("order held:", token, ex, repr(ex.__cause__))
+            send_confirm_retry(reply_token, token)
+            return
+        except Exception:
+            release(token)
+            journal.mark(token, journal.ABORT)
+            raise
+
         if not ok:
+            release(token)
+            journal.mark(token, journal.ABORT)
             clear_session(uid)
             reply_message(reply_token, [{"type": "text", "text": "สต๊อกไม่พอ ❌"}])
             return
 
-        order_id = create_order(uid, data)
+        entry["stock_done"] = True
+
+        try:
+            journal.mark(token, journal.STOCK)
+            create_order(uid, data, order_id)
+        except Exception as ex:
+            # สต๊อกตัดแล้ว -> ไม่คืน ค้าง token ไว้ให้กดซ้ำ / replay สร้างออเดอร์ต่อ
+            hold(token, entry)
+            print("order held:", token, repr(ex))
+            send_confirm_retry(reply_token, token)
+            return
+
+        journal.mark(token, journal.ORDER)
+        record_order(token, order_id)
         notify_admin_context(uid, {**data, "order_id": order_id})
 
         clear_session(uid)
 
-        reply_message(
-            reply_token,
-            [
-                quick(
-                    f"รับออเดอร์แล้ว ✅\nORDER ID: {order_id}",
-                    [],
-                    include_admin=True,
-                    include_menu=True,
-                )
-            ],
-        )
+        send_order_done(reply_token, order_id)
         return
 
     send_menu(reply_token)
 
 
+# ----------------------------------------------------------
+# ADMIN STATS
+# ----------------------------------------------------------
+
+def admin_stats(text):
+    args = text.split(":")[1:]
+    sub = args[0].strip().upper() if args else ""
+
+    if sub == "TODAY":
+        return stats_service.format_stats(f"วันนี้ {stats_service.today()}", stats_service.day_stats())
+
+    if sub == "WEEK":
+        return stats_service.format_stats("7 วันล่าสุด", stats_service.range_stats(7))
+
+    if sub == "SKU" and len(args) > 1 and "/" in args[1]:
+        sku = ":".join(args[1:]).strip()
+        return stats_service.format_sku_stats(sku, stats_service.sku_stats(sku))
+
+    if sub == "DAY" and len(args) > 1:
+        day = args[1].strip()
+        return stats_service.format_stats(f"วันที่ {day}", stats_service.day_stats(day))
+
+    if sub == "REBUILD":
+        try:
+            n = stats_service.rebuild()
+        except coord.LockTimeout:
+            return "⏳ กำลัง rebuild stats อยู่ ลองใหม่อีกครั้งนะคะ"
+        return f"✅ rebuild stats แล้ว ({n} วัน)"
+
+    return "คำสั่ง: STATS:TODAY / STATS:WEEK / STATS:SKU:สี/ไซส์ / STATS:DAY:YYYY-MM-DD / STATS:REBUILD"
+
+
+# ----------------------------------------------------------
+# JOURNAL
+# ----------------------------------------------------------
+
+def _recover(e):
+    """
+    ทำ entry ที่ค้างให้จบ
+    - ยังไม่ STOCK -> ถาม settle_stock ว่าเขียนลงชีตหรือยัง (ไม่มี WRITE = ยังไม่ได้เขียนแน่นอน)
+    - STOCK แล้ว   -> สร้างออเดอร์ต่อด้วย order_id เดิม
+    คืน order_id หรือ None ถ้ายกเลิก / ยังบอกไม่ได้ (token ยัง hold อยู่)
+    """
+    token, uid, order_id, data = e["id"], e["uid"], e["order_id"], e["data"]
+
+    # worker อื่นกำลังทำ token นี้อยู่ -> LockTimeout ทันที ไม่รอ
+    # อายุ lock พอสำหรับ settle (อ่าน) + get_order + create_order
+    with coord.lock("recover:" + token, ttl=3 * call_budget_seconds(), wait=0):
+        done = lookup_order(token)
+        if done:
+            return done
+
+        # worker อื่นปิด entry นี้ไปแล้วระหว่างรอ lock (ABORT -> ปล่อย token แล้ว)
+        e = held(token)
+        if not e:
+            return None
+
+        if not e["stock_done"]:
+            applied = False
+            if e.get("write"):
+                applied = settle_stock(data["color"], data["size"], token, e["write"])
+            if applied is None:
+                # บอกไม่ได้ว่าเขียนลงชีตหรือยัง -> hold ไว้ให้ staff ตรวจ ห้ามปล่อยให้กดแล้วตัดซ้ำ
+                print("WARN: stock write unknown, please check stock:", data.get("color"), data.get("size"), token)
+                hold(token, e)
+                return None
+            if not applied:
+                release(token)
+                journal.mark(token, journal.ABORT)
+                return None
+            journal.mark(token, journal.STOCK)
+            hold(token, {**e, "stock_done": True})
+
+        # append อาจลงชีตแล้วแต่ request พัง -> เช็คก่อนสร้างซ้ำ
+        created = not get_order(order_id)
+        if created:
+            create_order(uid, data, order_id)
+
+        journal.mark(token, journal.ORDER)
+        record_order(token, order_id)
+        if created:
+            notify_admin_context(uid, {**data, "order_id": order_id})
+
+    return order_id
+
+
+def _resume(token):
+    e = held(token)
+    if not e:
+        return None
+    try:
+        return _recover(e)
+    except coord.LockTimeout:
+        return None
+
+
+def _replay(entries):
+    for e in entries:
+        try:
+            _recover(e)
+        except Exception as ex:
+            print("journal replay error:", e["id"], ex)
+
+
+def _adopt(token=None):
+    """
+    ย้าย entry ของ worker ที่ตายแล้วมาเป็นของเรา + hold token ไว้ใน coord ทันที
+    -> ทุก worker claim token นั้นไม่ได้ จนกว่า _recover จะปิดให้จบ
+    เจอ entry ใหม่ระหว่าง request (token อื่น) -> replay ใน background ไม่ให้ลูกค้ารอ
+    """
+    entries = journal.adopt(lambda e: hold(e["id"], e))
+
+    if token is not None:
+        rest = [e for e in entries if e["id"] != token]
+        if rest:
+            threading.Thread(target=_replay, args=(rest,), daemon=True).start()
+    return entries
+
+
+def replay_journal():
+    """
+    เรียกตอน start: ปิด entry ที่ค้างจาก worker ที่ตายไปแล้ว
+    (journal แยกไฟล์ต่อ worker -> ไม่แตะ entry ของ worker ที่ยังทำงานอยู่)
+    """
+    _replay(_adopt())
+    journal.compact()
+
+
 # ----------------------------------------------------------
 # ENTRY
 # ----------------------------------------------------------
@@ -327,10 +576,14 @@ def handle_event(event):
     uid = event["source"]["userId"]
     reply_token = event["replyToken"]
 
-    if event.get("type") == "message":
-        msg = event.get("message", {})
-        if msg.get("type") == "text":
-            handle(uid, reply_token, msg.get("text", "").strip())
-
-    if event.get("type") == "postback":
-        handle(uid, reply_token, event["postback"]["data"])
+    try:
+        if event.get("type") == "message":
+            msg = event.get("message", {})
+            if msg.get("type") == "text":
+                handle(uid, reply_token, msg.get("text", "").strip())
+
+        if event.get("type") == "postback":
+            handle(uid, reply_token, event["postback"]["data"])
+    except (SheetsBusyError, coord.LockTimeout) as e:
+        print("busy:", uid, type(e).__name__, e)
+        reply_message(reply_token, BUSY_MESSAGES)
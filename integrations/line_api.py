@@ -1,9 +1,9 @@
-import requests
 from core.config import LINE_CHANNEL_ACCESS_TOKEN
 
 LINE_REPLY_URL = "https://api.line.me/v2/bot/message/reply"
 LINE_PUSH_URL  = "https://api.line.me/v2/bot/message/push"
 LINE_BROADCAST_URL = "https://api.line.me/v2/bot/message/broadcast"
+LINE_MULTICAST_URL = "https://api.line.me/v2/bot/message/multicast"
 
 def _headers():
     return {
@@ -11,12 +11,17 @@ def _headers():
         "Content-Type": "application/json",
     }
 
+def _post(url, payload, timeout=10):
+    # import ตอนใช้ครั้งแรก (ไม่ถ่วง boot / health check)
+    import requests
+    return requests.post(url, headers=_headers(), json=payload, timeout=timeout)
+
 def reply_message(reply_token: str, messages: list):
     if not LINE_CHANNEL_ACCESS_TOKEN:
         print("WARN: LINE token not set. reply_message skipped.")
         return
     payload = {"replyToken": reply_token, "messages": messages}
-    r = requests.post(LINE_REPLY_URL, headers=_headers(), json=payload, timeout=10)
+    r = _post(LINE_REPLY_URL, payload)
     if r.status_code >= 300:
         print("LINE reply error:", r.status_code, r.text)
 
@@ -25,27 +30,32 @@ def push_message(to_user_id: str, messages: list):
         print("WARN: LINE token not set. push_message skipped.")
         return
     payload = {"to": to_user_id, "messages": messages}
-    r = requests.post(LINE_PUSH_URL, headers=_headers(), json=payload, timeout=10)
+    r = _post(LINE_PUSH_URL, payload)
     if r.status_code >= 300:
         print("LINE push error:", r.status_code, r.text)
 
+def multicast_message(to_user_ids: list, messages: list):
+    # 1 request ถึงหลายคน (สูงสุด 500 userId)
+    if not LINE_CHANNEL_ACCESS_TOKEN:
+        print("WARN: LINE token not set. multicast_message skipped.")
+        return
+    payload = {"to": to_user_ids, "messages": messages}
+    r = _post(LINE_MULTICAST_URL, payload)
+    if r.status_code >= 300:
+        print("LINE multicast error:", r.status_code, r.text)
+
 def broadcast_message(messages: list):
     if not LINE_CHANNEL_ACCESS_TOKEN:
         print("WARN: LINE token not set. broadcast_message skipped.")
         return
     payload = {"messages": messages}
-    r = requests.post(LINE_BROADCAST_URL, headers=_headers(), json=payload, timeout=10)
+    r = _post(LINE_BROADCAST_URL, payload)
     if r.status_code >= 300:
         print("LINE broadcast error:", r.status_code, r.text)
 def push_message(to_user_id: str, text: str):
-    url = "https://api.line.me/v2/bot/message/push"
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {LINE_CHANNEL_ACCESS_TOKEN}",
-    }
     payload = {
         "to": to_user_id,
         "messages": [{"type": "text", "text": text}],
     }
-    r = requests.post(url, headers=headers, json=payload, timeout=15)
+    r = _post(LINE_PUSH_URL, payload, timeout=15)
     return r.status_code, r.text
@@ -0,0 +1,462 @@
+# ==========================================================
+# HARDY LOAD TEST - PEAK SALE SIMULATOR
+# จำลองลูกค้าหลายร้อยคนกด BOT:ORDER พร้อมกัน
+# color -> size -> qty -> ชื่อ/เบอร์/ที่อยู่ -> confirm
+#
+# - ยิง webhook จริงของ app.py (body เซ็นด้วย core/security.py)
+# - Sheets / LINE เป็น fake backend (จำลอง latency + quota 429)
+# - สรุป throughput, tail latency, oversell, backend calls ต่อออเดอร์
+#
+# python scripts/loadtest.py --users 200 --ramp 5 --stock 30
+# python scripts/loadtest.py --backend mymodule:make_sheet   (fake ของตัวเอง)
+# ==========================================================
+
+import argparse
+import importlib
+import itertools
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import deque
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+COLORS = ["Navy", "Dark Coffee", "Black"]
+SIZES = ["S", "M", "L", "XL"]
+
+STOCK_HEADER = ["color", "size", "stock", "price"]
+SESSION_HEADER = ["uid", "state", "data", "updated_at", "expires_at"]
+ORDER_HEADER = [
+    "order_id", "uid", "confirm_token", "color", "size", "qty", "price", "total",
+    "name", "phone", "address", "payment_status", "status", "created_at",
+]
+
+
+# ----------------------------------------------------------
+# FAKE SHEETS (latency + per-minute quota)
+# ----------------------------------------------------------
+
+class QuotaExceeded(Exception):
+    """หน้าตาเหมือน gspread APIError 429 (sheets_service ดู .code)"""
+    code = 429
+
+
+class FakeWorksheet:
+    def __init__(self, sheet, rows):
+        self._sheet = sheet
+        self._rows = rows
+
+    def get_all_values(self):
+        with self._sheet.io():
+            return [list(r) for r in self._rows]
+
+    def get_all_records(self):
+        with self._sheet.io():
+            if not self._rows:
+                return []
+            header = self._rows[0]
+            return [dict(zip(header, r + [""] * (len(header) - len(r)))) for r in self._rows[1:]]
+
+    def append_row(self, row, value_input_option=None):
+        with self._sheet.io():
+            self._rows.append([str(x) for x in row])
+
+    def update(self, a1, values):
+        with self._sheet.io():
+            col = ord(a1[0]) - ord("A")
+            row = int(a1[1:]) - 1
+            while len(self._rows) <= row:
+                self._rows.append([])
+            r = self._rows[row]
+            for j, v in enumerate(values[0]):
+                while len(r) <= col + j:
+                    r.append("")
+                r[col + j] = str(v)
+
+
+class FakeSpreadsheet:
+    """
+    แทน gspread Spreadsheet: ทุก call หน่วง latency และนับ quota ต่อนาที
+    """
+
+    def __init__(self, stock_rows, latency_ms=300, jitter_ms=200, quota_per_min=60):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.quota_per_min = quota_per_min
+        self.calls = 0
+        self.rejected = 0
+        self._window = deque()
+        self._lock = threading.Lock()
+        self._data_lock = threading.Lock()
+        self.sheets = {
+            "HARDY_STOCK": [STOCK_HEADER] + stock_rows,
+            "HARDY_SESSION": [SESSION_HEADER],
+            "HARDY_ORDER": [ORDER_HEADER],
+        }
+
+    def _charge(self):
+        now = time.monotonic()
+        with self._lock:
+            while self._window and now - self._window[0] >= 60:
+                self._window.popleft()
+            if len(self._window) >= self.quota_per_min:
+                self.rejected += 1
+                raise QuotaExceeded("Quota exceeded (fake)")
+            self._window.append(now)
+            self.calls += 1
+
+    def _request(self):
+        self._charge()
+        time.sleep(max(0, self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)) / 1000)
+
+    def io(self):
+        # หน่วงก่อน แล้วอ่าน/เขียนแบบ atomic (เหมือน request เดียวของ Sheets)
+        self._request()
+        return self._data_lock
+
+    def worksheet(self, name):
+        self._request()
+        return FakeWorksheet(self, self.sheets.setdefault(name, []))
+
+
+def make_fake_sheet(args, stock_rows):
+    return FakeSpreadsheet(
+        stock_rows,
+        latency_ms=args.sheets_latency_ms,
+        jitter_ms=args.sheets_jitter_ms,
+        quota_per_min=args.quota,
+    )
+
+
+# ----------------------------------------------------------
+# FAKE LINE (เก็บ reply ตาม replyToken)
+# ----------------------------------------------------------
+
+class FakeLine:
+    def __init__(self, latency_ms=50):
+        self.latency_ms = latency_ms
+        self.replies = {}
+        self.calls = {"reply": 0, "push": 0, "multicast": 0, "broadcast": 0}
+        self._lock = threading.Lock()
+
+    def post(self, url, payload, timeout=10):
+        time.sleep(self.latency_ms / 1000)
+        kind = url.rsplit("/", 1)[-1]
+        with self._lock:
+            self.calls[kind] = self.calls.get(kind, 0) + 1
+            if kind == "reply":
+                self.replies[payload["replyToken"]] = payload["messages"]
+
+        class _Resp:
+            status_code = 200
+            text = ""
+
+        return _Resp()
+
+    def take(self, reply_token):
+        with self._lock:
+            return self.replies.pop(reply_token, [])
+
+
+# ----------------------------------------------------------
+# VIRTUAL CUSTOMER
+# ----------------------------------------------------------
+
+class Result:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = []
+        self.completed = 0
+        self.sold_out = 0
+        self.errors = 0
+        self.shed = 0
+        self.order_replies = {}   # confirm payload -> set(order_id)
+
+    def add_latency(self, ms):
+        with self.lock:
+            self.latencies.append(ms)
+
+
+def _event(uid, reply_token, text, postback):
+    ev = {
+        "replyToken": reply_token,
+        "source": {"type": "user", "userId": uid},
+        "timestamp": int(time.time() * 1000),
+        "mode": "active",
+    }
+    if postback:
+        ev["type"] = "postback"
+        ev["postback"] = {"data": text}
+    else:
+        ev["type"] = "message"
+        ev["message"] = {"type": "text", "id": reply_token, "text": text}
+    return ev
+
+
+def _buttons(messages):
+    out = []
+    for m in messages:
+        for item in (m.get("quickReply") or {}).get("items", []):
+            data = item["action"]["data"]
+            if data not in ("BOT:ADMIN", "BOT:MENU"):
+                out.append(data)
+    return out
+
+
+def _text(messages):
+    return "\n".join(m.get("text", "") for m in messages)
+
+
+class Customer:
+    def __init__(self, n, client, line, sign_body, result, args):
+        self.uid = f"ULOAD{n:06d}"
+        self.client = client
+        self.line = line
+        self.sign_body = sign_body
+        self.result = result
+        self.args = args
+        self._seq = itertools.count(1)
+
+    def send(self, text, postback=True):
+        reply_token = f"{self.uid}-{next(self._seq)}"
+        body = json.dumps({"destination": "loadtest", "events": [_event(self.uid, reply_token, text, postback)]})
+
+        t0 = time.perf_counter()
+        r = self.client.post(
+            "/webhook",
+            data=body,
+            headers={"X-Line-Signature": self.sign_body(body), "Content-Type": "application/json"},
+        )
+        self.result.add_latency((time.perf_counter() - t0) * 1000)
+
+        if r.status_code != 200:
+            with self.result.lock:
+                self.result.errors += 1
+            return None
+
+        messages = self.line.take(reply_token)
+        if "ถี่เกินไป" in _text(messages):
+            with self.result.lock:
+                self.result.shed += 1
+            return None
+        return messages
+
+    def think(self):
+        time.sleep(random.uniform(self.args.think_min, self.args.think_max))
+
+    def run(self):
+        # กดตามปุ่มที่บอทตอบจริง: สี -> ไซส์ -> จำนวน -> ยืนยันสินค้า
+        self.think()
+        messages = self.send("BOT:ORDER")
+
+        for prefix in ["BOT:COLOR:", "BOT:SIZE:", "BOT:QTY:", "BOT:ITEM_OK"]:
+            if messages is None:
+                return
+            opts = [b for b in _buttons(messages) if b.startswith(prefix)]
+            if prefix == "BOT:QTY:":
+                # ส่วนใหญ่ซื้อ 1-2 ตัว
+                opts = opts[:2]
+            if not opts:
+                return self._sold_out()
+            self.think()
+            messages = self.send(random.choice(opts))
+
+        for text in [f"ลูกค้า {self.uid}", "0812345678", "99/9 กรุงเทพฯ 10110"]:
+            if messages is None:
+                return
+            self.think()
+            messages = self.send(text, postback=False)
+
+        confirm = next((b for b in _buttons(messages or []) if b.startswith("BOT:FINAL_CONFIRM")), None)
+        if not confirm:
+            return
+
+        self.think()
+        if random.random() < self.args.double_tap:
+            # กดยืนยันซ้ำพร้อมกัน
+            replies = []
+            t = threading.Thread(target=lambda: replies.append(self.send(confirm)))
+            t.start()
+            replies.append(self.send(confirm))
+            t.join()
+        else:
+            replies = [self.send(confirm)]
+
+        for messages in replies:
+            self._confirm_result(confirm, messages)
+
+    def _sold_out(self):
+        with self.result.lock:
+            self.result.sold_out += 1
+
+    def _confirm_result(self, confirm, messages):
+        text = _text(messages or [])
+        with self.result.lock:
+            if "ORDER ID:" in text:
+                order_id = text.split("ORDER ID:", 1)[1].split()[0]
+                ids = self.result.order_replies.setdefault(confirm, set())
+                if not ids:
+                    self.result.completed += 1
+                ids.add(order_id)
+            elif "สต๊อกไม่พอ" in text:
+                self.result.sold_out += 1
+
+
+# ----------------------------------------------------------
+# RUN
+# ----------------------------------------------------------
+
+def _percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))
+    return round(values[k], 1)
+
+
+def _setup_env(args, workdir):
+    os.environ.setdefault("LINE_CHANNEL_SECRET", "loadtest-secret")
+    os.environ.setdefault("LINE_CHANNEL_ACCESS_TOKEN", "loadtest-token")
+    os.environ["WARM_UP_ON_BOOT"] = "0"
+    os.environ["ADMIN_USER_IDS"] = ""
+    os.environ["GOOGLE_SERVICE_ACCOUNT_JSON"] = "{}"
+    os.environ["SHEETS_QUOTA_PER_MIN"] = str(args.quota)
+    os.environ["IDEMPOTENCY_FILE"] = os.path.join(workdir, "confirm_tokens.jsonl")
+    os.environ["JOURNAL_FILE"] = os.path.join(workdir, "order_journal.jsonl")
+    # ห้ามใช้ COORD_BACKEND จาก env จริง (เช่น redis ของ production)
+    os.environ["COORD_BACKEND"] = args.coord
+    os.environ["COORD_SQLITE_FILE"] = os.path.join(workdir, "coord.db")
+    if not args.real_rate_limit:
+        os.environ["RATE_USER_PER_SEC"] = "1000"
+        os.environ["RATE_USER_BURST"] = "1000"
+        os.environ["RATE_GLOBAL_PER_SEC"] = "100000"
+        os.environ["RATE_GLOBAL_BURST"] = "100000"
+
+
+def _load_backend(spec):
+    if spec == "fake":
+        return make_fake_sheet
+    module, _, attr = spec.partition(":")
+    return getattr(importlib.import_module(module), attr or "make_sheet")
+
+
+def run(args):
+    workdir = tempfile.mkdtemp(prefix="hardy-loadtest-")
+    _setup_env(args, workdir)
+
+    random.seed(args.seed)
+
+    import app as app_module
+    from core.security import sign_body
+    from integrations import line_api
+    from services import sheets_service
+
+    stock_rows = [[c, s, str(args.stock), "1290"] for c in COLORS for s in SIZES]
+    initial = {(r[0], r[1]): int(r[2]) for r in stock_rows}
+
+    sheet = _load_backend(args.backend)(args, [list(r) for r in stock_rows])
+    line = FakeLine(args.line_latency_ms)
+
+    # ต่อ fake แทน Google / LINE
+    sheets_service._sheet = sheet
+    line_api._post = line.post
+
+    result = Result()
+    client_local = threading.local()
+
+    def client():
+        if not hasattr(client_local, "c"):
+            client_local.c = app_module.app.test_client()
+        return client_local.c
+
+    def worker(n):
+        time.sleep(random.uniform(0, args.ramp))
+        try:
+            Customer(n, client(), line, sign_body, result, args).run()
+        except Exception as e:
+            with result.lock:
+                result.errors += 1
+            print("customer error:", n, e)
+
+    t0 = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(args.users)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+
+    # oversell: ขายเกินสต๊อกตั้งต้น (นับจาก HARDY_ORDER จริง)
+    sold = {}
+    tokens = {}
+    for r in sheet.sheets["HARDY_ORDER"][1:]:
+        key = (r[3], r[4])
+        sold[key] = sold.get(key, 0) + int(r[5] or 0)
+        tokens[r[2]] = tokens.get(r[2], 0) + 1
+
+    oversell = sum(max(0, sold.get(k, 0) - v) for k, v in initial.items())
+    negative = sum(1 for r in sheet.sheets["HARDY_STOCK"][1:] if int(r[2]) < 0)
+    orders = len(sheet.sheets["HARDY_ORDER"]) - 1
+
+    report = {
+        "users": args.users,
+        "elapsed_s": round(elapsed, 2),
+        "orders_completed": result.completed,
+        "orders_in_sheet": orders,
+        "duplicate_orders": sum(n - 1 for n in tokens.values() if n > 1),
+        "sold_out": result.sold_out,
+        "errors": result.errors,
+        "rate_limited": result.shed,
+        "throughput_orders_per_s": round(result.completed / elapsed, 3) if elapsed else 0,
+        "webhook_latency_ms": {
+            "p50": _percentile(result.latencies, 50),
+            "p95": _percentile(result.latencies, 95),
+            "p99": _percentile(result.latencies, 99),
+            "max": _percentile(result.latencies, 100),
+        },
+        "oversell_units": oversell,
+        "negative_stock_rows": negative,
+        "sheets_calls": sheet.calls,
+        "sheets_429": sheet.rejected,
+        "sheets_calls_per_order": round(sheet.calls / result.completed, 1) if result.completed else None,
+        "line_calls": line.calls,
+        "scheduler": sheets_service.quota_stats(),
+    }
+
+    return report
+
+
+def main():
+    ap = argparse.ArgumentParser(description="HARDY peak sale load test")
+    ap.add_argument("--users", type=int, default=50)
+    ap.add_argument("--ramp", type=float, default=5.0, help="ลูกค้าเข้ามาภายในกี่วินาที")
+    ap.add_argument("--stock", type=int, default=10, help="สต๊อกเริ่มต้นต่อ SKU")
+    ap.add_argument("--think-min", type=float, default=0.2)
+    ap.add_argument("--think-max", type=float, default=1.5)
+    ap.add_argument("--double-tap", type=float, default=0.1, help="โอกาสกดยืนยันซ้ำพร้อมกัน")
+    ap.add_argument("--sheets-latency-ms", type=float, default=300)
+    ap.add_argument("--sheets-jitter-ms", type=float, default=200)
+    ap.add_argument("--line-latency-ms", type=float, default=50)
+    ap.add_argument("--quota", type=int, default=60, help="Sheets requests ต่อนาที")
+    ap.add_argument("--backend", default="fake", help="fake หรือ module:factory(args, stock_rows)")
+    ap.add_argument("--coord", choices=["memory", "sqlite"], default="memory", help="coord backend (sqlite อยู่ใน temp workdir)")
+    ap.add_argument("--real-rate-limit", action="store_true", help="ใช้ rate limit ตาม env จริง")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--out", default="", help="append ผลเป็น JSONL")
+    args = ap.parse_args()
+
+    report = run(args)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+    if args.out:
+        with open(args.out, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"ts": int(time.time()), **report}, ensure_ascii=False) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+# ==========================================================
+# HARDY STARTUP BENCH
+# วัด cold start ของ app.py
+# - import cost (python -X importtime)
+# - time-to-first-response ของ GET / (นับตั้งแต่ spawn process)
+#
+# python scripts/startup_bench.py [--runs 5] [--out bench_output.txt]
+# --out = append ผลเป็น JSONL ไว้เทียบย้อนหลัง
+# ==========================================================
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_FIRST_RESPONSE = (
+    "import time\n"
+    "import app\n"
+    "r = app.app.test_client().get('/')\n"
+    "assert r.status_code == 200, r.status_code\n"
+    "print(time.time())\n"
+)
+
+
+def _env():
+    env = dict(os.environ)
+    # วัดเฉพาะ boot + health check ไม่ต่อ Google
+    env["WARM_UP_ON_BOOT"] = "0"
+    return env
+
+
+def import_cost(top=10):
+    p = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"],
+        cwd=ROOT,
+        env=_env(),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    rows = []
+    for line in p.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cum_us, name = line[len("import time:"):].split("|")
+        rows.append((name.strip(), int(self_us), int(cum_us)))
+
+    total = next((cum for name, _, cum in rows if name == "app"), 0)
+    heaviest = sorted(rows, key=lambda r: -r[2])[:top]
+
+    return {
+        "import_app_ms": round(total / 1000, 1),
+        "heaviest": [{"module": n, "cumulative_ms": round(c / 1000, 1)} for n, _, c in heaviest],
+    }
+
+
+def first_response_ms():
+    t0 = time.time()
+    p = subprocess.run(
+        [sys.executable, "-c", _FIRST_RESPONSE],
+        cwd=ROOT,
+        env=_env(),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return round((float(p.stdout.strip().splitlines()[-1]) - t0) * 1000, 1)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--out", default="")
+    args = ap.parse_args()
+
+    imports = [import_cost() for _ in range(args.runs)]
+    firsts = [first_response_ms() for _ in range(args.runs)]
+
+    result = {
+        "ts": int(time.time()),
+        "runs": args.runs,
+        "import_app_ms_median": statistics.median(x["import_app_ms"] for x in imports),
+        "first_response_ms_median": statistics.median(firsts),
+        "first_response_ms_max": max(firsts),
+        "heaviest_imports": imports[-1]["heaviest"],
+    }
+
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+
+    if args.out:
+        with open(args.out, "a", encoding="utf-8") as f:
+            f.write(json.dumps(result, ensure_ascii=False) + "\n")
+
+
+if __name__ == "__main__":
+    main()
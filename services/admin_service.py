@@ -1,18 +1,40 @@
 # ==========================================================
 # HARDY ADMIN SERVICE - PRODUCTION
 # - push context to admin
-# - forward customer chat to admin
+# - forward customer chat to admin (relay + batching)
+# - admin reply -> customer (#<id> ข้อความ), claim เคส
 # - admin close order
 # ==========================================================
 
 from __future__ import annotations
-from core.config import ADMIN_USER_IDS
-from integrations.line_api import push_message
+import hashlib
+import re
+import threading
+from core.config import ADMIN_USER_IDS, RELAY_BATCH_SECONDS, RELAY_CONVERSATION_TTL_SECONDS
+from integrations.line_api import push_message, multicast_message
+from services import coord_service as coord
 from services.order_service import update_order_status
 
+LINE_TEXT_LIMIT = 5000
+
 def is_admin_uid(uid: str) -> bool:
     return uid in (ADMIN_USER_IDS or [])
 
+
+def _send_to_admins(text: str, admin_uids: list | None = None):
+    """
+    1 request ต่อข้อความ: คนเดียว = push, หลายคน = multicast
+    """
+    targets = admin_uids or ADMIN_USER_IDS
+    if not targets:
+        return
+
+    text = text[:LINE_TEXT_LIMIT]
+    if len(targets) == 1:
+        push_message(targets[0], text)
+    else:
+        multicast_message(list(targets), [{"type": "text", "text": text}])
+
 def notify_admin_context(customer_uid: str, ctx: dict):
     """
     ส่ง context ล่าสุดให้แอดมิน (ถ้ามีข้อมูลสินค้า/ออเดอร์)
@@ -49,17 +71,145 @@ def notify_admin_context(customer_uid: str, ctx: dict):
             lines.append("🧩 ปิดออเดอร์: พิมพ์")
             lines.append(f"CLOSE:{ctx.get('order_id')}")
 
+        if ctx.get("conv_id"):
+            lines.append("")
+            lines.append(f"💬 ตอบกลับ: #{ctx.get('conv_id')} ข้อความ")
+            lines.append(f"🙋 รับเคส: CLAIM:{ctx.get('conv_id')}")
+
     text = "\n".join(lines)
 
-    for admin_uid in ADMIN_USER_IDS:
-        push_message(admin_uid, text)
+    _send_to_admins(text)
+
+
+# ----------------------------------------------------------
+# RELAY (ลูกค้า <-> แอดมิน)
+# conv_id = hash ของ UID (สั้น, ไม่ซ้ำคนอื่น, เหมือนเดิมทุก worker / หลัง restart)
+# เคส / การรับเคส / buffer อยู่ใน coord_service -> แอดมินตอบผ่าน worker ไหนก็ได้
+# ----------------------------------------------------------
+
+_CONV_ID_RE = re.compile(r"^[0-9a-f]{8,64}$")
+
+
+def _conv_key(conv_id: str) -> str:
+    return "conv:" + conv_id
+
+
+def _claim_key(conv_id: str) -> str:
+    return "convclaim:" + conv_id
+
+
+def open_conversation(customer_uid: str) -> str:
+    digest = hashlib.sha256(customer_uid.encode()).hexdigest()
+
+    # hash ชนกับลูกค้าอื่น (แทบไม่เกิด) -> ใช้ hash ที่ยาวขึ้น
+    for n in (8, 12, 16, 64):
+        conv_id = digest[:n]
+        key = _conv_key(conv_id)
+        owner = coord.get_value(key)
+        if owner is None and coord.set_nx(key, customer_uid, RELAY_CONVERSATION_TTL_SECONDS):
+            return conv_id
+        if (owner or coord.get_value(key)) == customer_uid:
+            # ต่ออายุเคสทุกครั้งที่ลูกค้าคุย
+            coord.set_value(key, customer_uid, RELAY_CONVERSATION_TTL_SECONDS)
+            return conv_id
+
+    return digest
+
+
+def _customer_of(conv_id: str):
+    return coord.get_value(_conv_key(conv_id))
+
 
 def forward_to_admin(customer_uid: str, message: str):
+    """
+    buffer ข้อความลูกค้า แล้วส่งรวบเป็น 1 push ต่อ RELAY_BATCH_SECONDS
+    (worker ที่ได้ข้อความแรกของรอบเป็นคนตั้งเวลา flush)
+    """
     if not ADMIN_USER_IDS:
         return
-    text = f"💬 ข้อความจากลูกค้า\nUID: {customer_uid}\n\n{message}"
-    for admin_uid in ADMIN_USER_IDS:
-        push_message(admin_uid, text)
+
+    conv_id = open_conversation(customer_uid)
+    coord.rpush("relaybuf:" + conv_id, message, RELAY_CONVERSATION_TTL_SECONDS)
+
+    if RELAY_BATCH_SECONDS <= 0:
+        _flush(conv_id)
+        return
+
+    # worker ตายก่อน flush -> flag หมดอายุ ข้อความถัดไปตั้งเวลาใหม่
+    if not coord.set_nx("relayflush:" + conv_id, "1", RELAY_BATCH_SECONDS + 30):
+        return
+
+    t = threading.Timer(RELAY_BATCH_SECONDS, _flush, [conv_id])
+    t.daemon = True
+    t.start()
+
+
+def _flush(conv_id: str):
+    # ลบ flag ก่อนดึงข้อความ -> ข้อความที่เข้ามาหลังจากนี้ได้ตั้งรอบใหม่ ไม่ค้าง
+    coord.delete("relayflush:" + conv_id)
+    messages = coord.pop_all("relaybuf:" + conv_id)
+    if not messages:
+        return
+
+    customer_uid = _customer_of(conv_id) or ""
+    admin_uid = coord.get_value(_claim_key(conv_id))
+
+    lines = [f"💬 ข้อความจากลูกค้า #{conv_id}", f"UID: {customer_uid}", ""]
+    lines += messages
+    lines += ["", f"ตอบกลับ: #{conv_id} ข้อความ"]
+    if not admin_uid:
+        lines.append(f"รับเคส: CLAIM:{conv_id}")
+
+    # claim แล้ว -> ส่งเฉพาะแอดมินที่รับเคส
+    _send_to_admins("\n".join(lines), [admin_uid] if admin_uid else None)
+
+
+def _conv_id_of(s: str):
+    s = s.strip().lstrip("#").lower()
+    return s if _CONV_ID_RE.match(s) else None
+
+
+def handle_admin_relay(admin_uid: str, text: str):
+    """
+    คำสั่ง relay ของแอดมิน คืนข้อความตอบแอดมิน (None = ไม่ใช่คำสั่ง relay)
+    #<id> ข้อความ / CLAIM:<id> / RELEASE:<id>
+    """
+    upper = text.upper()
+
+    if text.startswith("#"):
+        head, _, message = text.partition(" ")
+        conv_id = _conv_id_of(head)
+        if conv_id is None:
+            return None
+
+        customer_uid = _customer_of(conv_id)
+        if not customer_uid:
+            return f"❌ ไม่พบเคส #{conv_id}"
+        if not message.strip():
+            return f"❌ พิมพ์: #{conv_id} ข้อความ"
+
+        push_message(customer_uid, f"👩‍💼 เจ้าหน้าที่:\n{message.strip()}")
+        return f"✅ ส่งถึง #{conv_id} แล้ว"
+
+    if upper.startswith("CLAIM:") or upper.startswith("RELEASE:"):
+        raw = text.split(":", 1)[1].strip()
+        conv_id = _conv_id_of(raw)
+        if conv_id is None or not _customer_of(conv_id):
+            return f"❌ ไม่พบเคส #{conv_id or raw}"
+
+        key = _claim_key(conv_id)
+
+        if upper.startswith("CLAIM:"):
+            # set_nx -> แอดมินสองคนกด CLAIM พร้อมกัน ได้คนเดียว
+            if not coord.set_nx(key, admin_uid, RELAY_CONVERSATION_TTL_SECONDS):
+                if coord.get_value(key) != admin_uid:
+                    return f"❌ เคส #{conv_id} มีแอดมินรับแล้ว"
+            return f"✅ รับเคส #{conv_id} แล้ว (ข้อความลูกค้าจะส่งถึงคุณคนเดียว)"
+
+        coord.delete(key, only_if=admin_uid)
+        return f"✅ ปล่อยเคส #{conv_id} แล้ว"
+
+    return None
 
 def admin_close_order(order_id: str) -> bool:
     return update_order_status(order_id, "CLOSED")
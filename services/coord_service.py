@@ -0,0 +1,486 @@
+# ==========================================================
+# HARDY COORD SERVICE - MULTI WORKER / MULTI NODE
+# state ที่ต้องแชร์ระหว่าง gunicorn workers / instances
+# - shared key/value + TTL (session cache, idempotency)
+# - lock ข้าม worker (ตัดสต๊อก)
+# - version counter สำหรับ invalidate cache ทุก worker
+# - hash + atomic incr ต่อ field (ตัวนับ stats)
+# - list: rpush + pop_all แบบ atomic (buffer ข้อความ relay)
+#
+# COORD_BACKEND:
+#   memory -> process เดียว (default)
+#   sqlite -> หลาย worker บนเครื่องเดียว (COORD_SQLITE_FILE)
+#   redis  -> หลายเครื่อง (REDIS_URL, RESP protocol ตรง ๆ)
+# ==========================================================
+
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from urllib.parse import urlparse
+from core.config import COORD_BACKEND, COORD_SQLITE_FILE, REDIS_URL
+
+LOCK_TTL_SECONDS = 30
+LOCK_WAIT_SECONDS = 20
+LOCK_POLL_SECONDS = 0.05
+
+
+class LockTimeout(Exception):
+    """รอ lock นานเกิน LOCK_WAIT_SECONDS"""
+
+
+class LockLost(Exception):
+    """lock หมดอายุ / มีคนอื่นถือแทนแล้ว"""
+
+
+# ----------------------------------------------------------
+# MEMORY
+# ----------------------------------------------------------
+
+class MemoryBackend:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = {}   # key -> (value, expires_at | None)
+        self._hash = {}   # key -> {field: int}
+        self._lists = {}  # key -> ([value], expires_at | None)
+
+    def _alive(self, key, now):
+        item = self._data.get(key)
+        if item and item[1] is not None and item[1] <= now:
+            del self._data[key]
+            return None
+        return item
+
+    def get(self, key):
+        with self._lock:
+            item = self._alive(key, time.time())
+            return item[0] if item else None
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._data[key] = (str(value), time.time() + ttl if ttl else None)
+
+    def set_nx(self, key, value, ttl=None):
+        with self._lock:
+            now = time.time()
+            if self._alive(key, now):
+                return False
+            self._data[key] = (str(value), now + ttl if ttl else None)
+            return True
+
+    def delete(self, key, only_if=None):
+        with self._lock:
+            item = self._alive(key, time.time())
+            if item and (only_if is None or item[0] == only_if):
+                del self._data[key]
+            if only_if is None:
+                self._hash.pop(key, None)
+
+    def expire_if(self, key, owner, ttl):
+        with self._lock:
+            item = self._alive(key, time.time())
+            if not item or item[0] != owner:
+                return False
+            self._data[key] = (item[0], time.time() + ttl)
+            return True
+
+    def incr(self, key, by=1, ttl=None):
+        with self._lock:
+            now = time.time()
+            item = self._alive(key, now)
+            n = int(item[0]) + by if item else by
+            exp = now + ttl if ttl else (item[1] if item else None)
+            self._data[key] = (str(n), exp)
+            return n
+
+    def hincr(self, key, field, by=1):
+        with self._lock:
+            h = self._hash.setdefault(key, {})
+            h[field] = h.get(field, 0) + by
+            return h[field]
+
+    def hgetall(self, key):
+        with self._lock:
+            return dict(self._hash.get(key, {}))
+
+    def rpush(self, key, value, ttl=None):
+        with self._lock:
+            now = time.time()
+            items, exp = self._lists.get(key, ([], None))
+            if exp is not None and exp <= now:
+                items = []
+            items.append(str(value))
+            self._lists[key] = (items, now + ttl if ttl else None)
+
+    def pop_all(self, key):
+        with self._lock:
+            items, exp = self._lists.pop(key, ([], None))
+            if exp is not None and exp <= time.time():
+                return []
+            return items
+
+
+# ----------------------------------------------------------
+# SQLITE (one host, many processes)
+# ----------------------------------------------------------
+
+class SQLiteBackend:
+    def __init__(self, path):
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self._path = path
+        self._local = threading.local()
+        self._conn().execute("CREATE TABLE IF NOT EXISTS kv (k TEXT PRIMARY KEY, v TEXT, exp REAL)")
+        self._conn().execute("CREATE TABLE IF NOT EXISTS h (k TEXT, f TEXT, v INTEGER, PRIMARY KEY (k, f))")
+        self._conn().execute("CREATE TABLE IF NOT EXISTS l (k TEXT, v TEXT, exp REAL)")
+
+    def _conn(self):
+        c = getattr(self._local, "conn", None)
+        if c is None:
+            # isolation_level=None -> จัดการ BEGIN IMMEDIATE เอง (lock ระดับไฟล์)
+            c = sqlite3.connect(self._path, timeout=LOCK_WAIT_SECONDS, isolation_level=None)
+            c.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = c
+        return c
+
+    @contextmanager
+    def _tx(self):
+        c = self._conn()
+        c.execute("BEGIN IMMEDIATE")
+        try:
+            c.execute("DELETE FROM kv WHERE exp IS NOT NULL AND exp <= ?", (time.time(),))
+            yield c
+            c.execute("COMMIT")
+        except Exception:
+            c.execute("ROLLBACK")
+            raise
+
+    def get(self, key):
+        row = self._conn().execute(
+            "SELECT v FROM kv WHERE k = ? AND (exp IS NULL OR exp > ?)", (key, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key, value, ttl=None):
+        with self._tx() as c:
+            c.execute(
+                "INSERT OR REPLACE INTO kv (k, v, exp) VALUES (?, ?, ?)",
+                (key, str(value), time.time() + ttl if ttl else None),
+            )
+
+    def set_nx(self, key, value, ttl=None):
+        with self._tx() as c:
+            if c.execute("SELECT 1 FROM kv WHERE k = ?", (key,)).fetchone():
+                return False
+            c.execute(
+                "INSERT INTO kv (k, v, exp) VALUES (?, ?, ?)",
+                (key, str(value), time.time() + ttl if ttl else None),
+            )
+            return True
+
+    def delete(self, key, only_if=None):
+        with self._tx() as c:
+            if only_if is None:
+                c.execute("DELETE FROM kv WHERE k = ?", (key,))
+                c.execute("DELETE FROM h WHERE k = ?", (key,))
+            else:
+                c.execute("DELETE FROM kv WHERE k = ? AND v = ?", (key, str(only_if)))
+
+    def expire_if(self, key, owner, ttl):
+        with self._tx() as c:
+            cur = c.execute(
+                "UPDATE kv SET exp = ? WHERE k = ? AND v = ?",
+                (time.time() + ttl, key, str(owner)),
+            )
+            return cur.rowcount == 1
+
+    def incr(self, key, by=1, ttl=None):
+        with self._tx() as c:
+            row = c.execute("SELECT v, exp FROM kv WHERE k = ?", (key,)).fetchone()
+            n = int(row[0]) + by if row else by
+            exp = time.time() + ttl if ttl else (row[1] if row else None)
+            c.execute("INSERT OR REPLACE INTO kv (k, v, exp) VALUES (?, ?, ?)", (key, str(n), exp))
+            return n
+
+    def hincr(self, key, field, by=1):
+        with self._tx() as c:
+            c.execute(
+                "INSERT INTO h (k, f, v) VALUES (?, ?, ?) ON CONFLICT (k, f) DO UPDATE SET v = v + excluded.v",
+                (key, field, int(by)),
+            )
+            return c.execute("SELECT v FROM h WHERE k = ? AND f = ?", (key, field)).fetchone()[0]
+
+    def hgetall(self, key):
+        rows = self._conn().execute("SELECT f, v FROM h WHERE k = ?", (key,)).fetchall()
+        return {f: v for f, v in rows}
+
+    def rpush(self, key, value, ttl=None):
+        with self._tx() as c:
+            exp = time.time() + ttl if ttl else None
+            c.execute("INSERT INTO l (k, v, exp) VALUES (?, ?, ?)", (key, str(value), exp))
+            # อายุของทั้ง list นับจากตัวล่าสุด (เหมือน redis EXPIRE)
+            c.execute("UPDATE l SET exp = ? WHERE k = ?", (exp, key))
+
+    def pop_all(self, key):
+        with self._tx() as c:
+            rows = c.execute(
+                "SELECT v FROM l WHERE k = ? AND (exp IS NULL OR exp > ?) ORDER BY rowid",
+                (key, time.time()),
+            ).fetchall()
+            c.execute("DELETE FROM l WHERE k = ?", (key,))
+            return [r[0] for r in rows]
+
+
+# ----------------------------------------------------------
+# REDIS (RESP over TCP, ไม่ต้องพึ่ง redis-py)
+# ----------------------------------------------------------
+
+# compare-and-delete สำหรับปลด lock เฉพาะเจ้าของ
+_DEL_IF_SCRIPT = "if redis.call('GET', KEYS[1]) == ARGV[1] then return redis.call('DEL', KEYS[1]) end return 0"
+# อ่านทั้ง list แล้วลบในคำสั่งเดียว
+_POP_ALL_SCRIPT = "local v = redis.call('LRANGE', KEYS[1], 0, -1) redis.call('DEL', KEYS[1]) return v"
+# compare-and-expire สำหรับต่ออายุ lock เฉพาะเจ้าของ
+_EXPIRE_IF_SCRIPT = "if redis.call('GET', KEYS[1]) == ARGV[1] then return redis.call('PEXPIRE', KEYS[1], ARGV[2]) end return 0"
+
+
+class RedisError(Exception):
+    pass
+
+
+class RedisBackend:
+    def __init__(self, url):
+        u = urlparse(url or "redis://127.0.0.1:6379/0")
+        self._host = u.hostname or "127.0.0.1"
+        self._port = u.port or 6379
+        self._password = u.password
+        self._db = int((u.path or "/0").lstrip("/") or 0)
+        self._local = threading.local()
+
+    def _sock(self):
+        s = getattr(self._local, "sock", None)
+        if s is None:
+            s = socket.create_connection((self._host, self._port), timeout=5)
+            self._local.sock = s
+            self._local.buf = s.makefile("rb")
+            if self._password:
+                self._send("AUTH", self._password)
+            if self._db:
+                self._send("SELECT", self._db)
+        return s
+
+    def _close(self):
+        # ปิดทั้ง makefile และ socket (ไม่งั้น fd รั่วทุกครั้งที่ reconnect)
+        s, buf = getattr(self._local, "sock", None), getattr(self._local, "buf", None)
+        self._local.sock = self._local.buf = None
+        for f in (buf, s):
+            if f is not None:
+                try:
+                    f.close()
+                except OSError:
+                    pass
+
+    def _read(self):
+        line = self._local.buf.readline()
+        if not line:
+            raise RedisError("connection closed")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest.decode()
+        if kind == b"-":
+            raise RedisError(rest.decode())
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            n = int(rest)
+            if n < 0:
+                return None
+            data = self._local.buf.read(n + 2)
+            return data[:-2].decode()
+        if kind == b"*":
+            n = int(rest)
+            return None if n < 0 else [self._read() for _ in range(n)]
+        raise RedisError(f"bad reply: {line!r}")
+
+    def _send(self, *args):
+        out = [b"*%d\r\n" % len(args)]
+        for a in args:
+            b = str(a).encode()
+            out.append(b"$%d\r\n%s\r\n" % (len(b), b))
+        self._local.sock.sendall(b"".join(out))
+        return self._read()
+
+    def _cmd(self, *args):
+        try:
+            self._sock()
+            return self._send(*args)
+        except (OSError, RedisError) as e:
+            # reconnect ครั้งเดียว (connection หลุด / server restart)
+            if isinstance(e, RedisError) and str(e) != "connection closed":
+                raise
+            # socket เดิมอาจมี reply ค้างอ่านไม่หมด -> ทิ้งทั้งเส้น
+            self._close()
+            self._sock()
+            return self._send(*args)
+
+    def get(self, key):
+        return self._cmd("GET", key)
+
+    def set(self, key, value, ttl=None):
+        if ttl:
+            self._cmd("SET", key, value, "PX", int(ttl * 1000))
+        else:
+            self._cmd("SET", key, value)
+
+    def set_nx(self, key, value, ttl=None):
+        if ttl:
+            return self._cmd("SET", key, value, "NX", "PX", int(ttl * 1000)) == "OK"
+        return self._cmd("SET", key, value, "NX") == "OK"
+
+    def delete(self, key, only_if=None):
+        if only_if is None:
+            self._cmd("DEL", key)
+        else:
+            self._cmd("EVAL", _DEL_IF_SCRIPT, 1, key, only_if)
+
+    def expire_if(self, key, owner, ttl):
+        return self._cmd("EVAL", _EXPIRE_IF_SCRIPT, 1, key, owner, int(ttl * 1000)) == 1
+
+    def incr(self, key, by=1, ttl=None):
+        n = self._cmd("INCRBY", key, int(by))
+        if ttl:
+            self._cmd("PEXPIRE", key, int(ttl * 1000))
+        return n
+
+    def hincr(self, key, field, by=1):
+        return self._cmd("HINCRBY", key, field, int(by))
+
+    def hgetall(self, key):
+        flat = self._cmd("HGETALL", key) or []
+        return {flat[i]: int(flat[i + 1]) for i in range(0, len(flat), 2)}
+
+    def rpush(self, key, value, ttl=None):
+        self._cmd("RPUSH", key, value)
+        if ttl:
+            self._cmd("PEXPIRE", key, int(ttl * 1000))
+
+    def pop_all(self, key):
+        return self._cmd("EVAL", _POP_ALL_SCRIPT, 1, key) or []
+
+
+# ----------------------------------------------------------
+# MODULE API
+# ----------------------------------------------------------
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def make_backend(name):
+    if name == "sqlite":
+        return SQLiteBackend(COORD_SQLITE_FILE)
+    if name == "redis":
+        return RedisBackend(REDIS_URL)
+    return MemoryBackend()
+
+
+def backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = make_backend(COORD_BACKEND)
+    return _backend
+
+
+def get_value(key):
+    return backend().get(key)
+
+
+def set_value(key, value, ttl=None):
+    backend().set(key, value, ttl)
+
+
+def set_nx(key, value, ttl=None):
+    return backend().set_nx(key, value, ttl)
+
+
+def delete(key, only_if=None):
+    backend().delete(key, only_if)
+
+
+def incr(key, by=1, ttl=None):
+    """
+    เพิ่มค่าแบบ atomic (ttl = ตั้งอายุ key ใหม่ทุกครั้งที่เพิ่ม)
+    """
+    return backend().incr(key, by, ttl)
+
+
+def hincr(key, field, by=1):
+    """
+    เพิ่มค่า field ใน hash แบบ atomic (ไม่ต้องถือ lock)
+    """
+    return backend().hincr(key, field, by)
+
+
+def hgetall(key):
+    return backend().hgetall(key)
+
+
+def rpush(key, value, ttl=None):
+    backend().rpush(key, value, ttl)
+
+
+def pop_all(key):
+    """
+    คืนทุกค่าใน list แล้วลบ (atomic -> ข้อความไม่หาย / ไม่ส่งซ้ำข้าม worker)
+    """
+    return backend().pop_all(key)
+
+
+class HeldLock:
+    def __init__(self, key, owner):
+        self.key = key
+        self.owner = owner
+
+    def extend(self, ttl):
+        """
+        เช็คว่ายังเป็นเจ้าของ + ต่ออายุ ก่อนทำงานที่ต้องถือ lock (เช่น เขียนชีต)
+        """
+        if not backend().expire_if(self.key, self.owner, ttl):
+            raise LockLost(self.key)
+
+
+@contextmanager
+def lock(name, ttl=LOCK_TTL_SECONDS, wait=LOCK_WAIT_SECONDS):
+    """
+    lock ข้าม worker (TTL กัน lock ค้างถ้า worker ตาย)
+    yield HeldLock -> .extend(ttl) ก่อนเขียนถ้างานอาจนานเกิน ttl
+    """
+    key = "lock:" + name
+    owner = uuid.uuid4().hex
+    deadline = time.monotonic() + wait
+
+    while not backend().set_nx(key, owner, ttl):
+        if time.monotonic() >= deadline:
+            raise LockTimeout(name)
+        time.sleep(LOCK_POLL_SECONDS)
+
+    try:
+        yield HeldLock(key, owner)
+    finally:
+        backend().delete(key, only_if=owner)
+
+
+def version(name):
+    return int(backend().get("ver:" + name) or 0)
+
+
+def invalidate(name):
+    """
+    broadcast: เพิ่ม version -> ทุก worker เห็นว่า cache เก่า
+    """
+    return backend().incr("ver:" + name)
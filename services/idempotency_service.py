@@ -0,0 +1,203 @@
+# ==========================================================
+# HARDY IDEMPOTENCY SERVICE
+# confirm_token -> order_id
+# - memory index (ไม่แตะ Sheets)
+# - persist เป็น JSONL ไฟล์ local (โหลดกลับตอนเริ่ม)
+# - หมดอายุหลัง ORDER_TTL_SECONDS (เท่ากับ copy ใน coord) + compact ไฟล์
+# - แชร์ข้าม worker ผ่าน coord_service
+# ==========================================================
+
+import json
+import os
+import threading
+import time
+from core.config import IDEMPOTENCY_FILE
+from core.utils import file_lock
+from services import coord_service as coord
+from services.sheets_service import call_budget_seconds
+
+ORDER_TTL_SECONDS = 7 * 24 * 3600
+# compact ไฟล์ทุก ๆ กี่บรรทัดที่ append
+COMPACT_EVERY = 1000
+
+_lock = threading.Lock()
+_index = {}          # confirm_token -> (order_id, ts)
+_in_flight = set()   # confirm_token ที่กำลังตัดสต๊อก/สร้างออเดอร์
+_loaded = False
+_appended = 0
+
+
+def _read_file(now):
+    """
+    entry ที่ยังไม่หมดอายุในไฟล์ (บรรทัดเก่าไม่มี ts = นับว่าเพิ่งเขียน)
+    """
+    out = {}
+    if not IDEMPOTENCY_FILE or not os.path.exists(IDEMPOTENCY_FILE):
+        return out
+
+    with open(IDEMPOTENCY_FILE, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                r = json.loads(line)
+            except ValueError:
+                # บรรทัดท้ายไฟล์อาจขาดตอนถ้า process ตายระหว่างเขียน
+                continue
+            ts = r.get("ts") or now
+            if r.get("token") and r.get("order_id") and now - ts < ORDER_TTL_SECONDS:
+                out[r["token"]] = (r["order_id"], ts)
+    return out
+
+
+def _compact(now):
+    """
+    เขียนไฟล์ใหม่เหลือเฉพาะ entry ที่ยังไม่หมดอายุ
+    (อ่านไฟล์ใหม่ใต้ file lock -> ไม่ทิ้งบรรทัดของ worker อื่น)
+    """
+    global _appended
+    _appended = 0
+
+    for token, (_, ts) in list(_index.items()):
+        if now - ts >= ORDER_TTL_SECONDS:
+            del _index[token]
+
+    if not IDEMPOTENCY_FILE:
+        return
+
+    with file_lock(IDEMPOTENCY_FILE):
+        live = _read_file(now)
+        tmp = IDEMPOTENCY_FILE + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            for token, (order_id, ts) in live.items():
+                f.write(json.dumps({"token": token, "order_id": order_id, "ts": ts}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, IDEMPOTENCY_FILE)
+
+
+def _load():
+    global _loaded
+    if _loaded:
+        return
+    _loaded = True
+
+    now = int(time.time())
+    _index.update(_read_file(now))
+    _compact(now)
+
+
+def _persist(token, order_id, ts):
+    global _appended
+    if not IDEMPOTENCY_FILE:
+        return
+
+    with file_lock(IDEMPOTENCY_FILE):
+        with open(IDEMPOTENCY_FILE, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"token": token, "order_id": order_id, "ts": ts}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    _appended += 1
+    if _appended >= COMPACT_EVERY:
+        _compact(ts)
+
+
+def _get(token):
+    item = _index.get(token)
+    if not item:
+        return None
+    if time.time() - item[1] >= ORDER_TTL_SECONDS:
+        del _index[token]
+        return None
+    return item[0]
+
+
+def lookup_order(token):
+    """
+    คืน order_id ถ้า token นี้เคยสร้างออเดอร์แล้ว (ไม่เรียก backend)
+    """
+    if not token:
+        return None
+    with _lock:
+        _load()
+        order_id = _get(token)
+    if order_id:
+        return order_id
+
+    # worker อื่นอาจสร้างออเดอร์ไปแล้ว (ไม่รู้เวลาสร้างจริง -> ให้อายุเต็มจากตอนนี้)
+    order_id = coord.get_value("order:" + token)
+    if order_id:
+        with _lock:
+            _index[token] = (order_id, int(time.time()))
+    return order_id
+
+
+def _claim_ttl():
+    """
+    token ที่จองไว้แต่ worker ตายระหว่างทาง -> ปล่อยเองหลังเวลานี้
+    ต้องนานกว่า request ที่ช้าที่สุด (รอ lock สต๊อก + ตัดสต๊อก + สร้างออเดอร์)
+    ไม่งั้น token หลุดระหว่างที่ request แรกยังเขียนอยู่ -> กดซ้ำแล้วตัดซ้ำ
+    """
+    return coord.LOCK_WAIT_SECONDS + 2 * call_budget_seconds()
+
+
+def claim(token):
+    """
+    จอง token ก่อนตัดสต๊อก
+    False = token นี้มีออเดอร์แล้ว หรือกำลังประมวลผลอยู่
+    """
+    if not token:
+        return False
+    with _lock:
+        _load()
+        if _get(token) or token in _in_flight:
+            return False
+        if not coord.set_nx("claim:" + token, "1", _claim_ttl()):
+            return False
+        _in_flight.add(token)
+        return True
+
+
+def release(token):
+    """
+    ยกเลิกการจอง (เช่น สต๊อกไม่พอ / เขียน Sheets ไม่สำเร็จ)
+    """
+    with _lock:
+        _in_flight.discard(token)
+    coord.delete("claim:" + token)
+
+
+def hold(token, entry):
+    """
+    request พังหลังเริ่มเขียนสต๊อก -> จอง token ต่อ (ไม่ให้ตัดสต๊อกซ้ำ)
+    พร้อมข้อมูลพอให้ worker ไหนก็ได้ทำต่อตอนลูกค้ากดยืนยันซ้ำ / replay
+    """
+    with _lock:
+        _in_flight.discard(token)
+    coord.set_value("claim:" + token, json.dumps(entry, ensure_ascii=False), ORDER_TTL_SECONDS)
+
+
+def held(token):
+    """
+    entry ที่ hold ไว้ (None = ไม่ได้ hold / กำลังประมวลผลปกติ)
+    """
+    raw = coord.get_value("claim:" + token) if token else None
+    if not raw or raw == "1":
+        return None
+    try:
+        return json.loads(raw)
+    except ValueError:
+        return None
+
+
+def record_order(token, order_id):
+    ts = int(time.time())
+    with _lock:
+        _load()
+        _index[token] = (order_id, ts)
+        _in_flight.discard(token)
+        _persist(token, order_id, ts)
+    coord.set_value("order:" + token, order_id, ORDER_TTL_SECONDS)
+    coord.delete("claim:" + token)
@@ -0,0 +1,240 @@
+# ==========================================================
+# HARDY JOURNAL SERVICE - WRITE-AHEAD LOG
+# บันทึก intent ก่อนตัดสต๊อก / สร้างออเดอร์ (JSONL + fsync)
+#
+# 1 ออเดอร์ = 1 id (confirm_token)
+#   BEGIN    -> ก่อนเรียก Sheets
+#   WRITE    -> กำลังเขียนสต๊อก (row, before, after) ก่อนเรียก update
+#   STOCK    -> ตัดสต๊อกสำเร็จ
+#   ORDER    -> สร้างออเดอร์สำเร็จ (จบ)
+#   ABORT    -> ยกเลิก / คืนสต๊อกแล้ว (จบ)
+#
+# 1 worker = 1 ไฟล์ (<JOURNAL_FILE>.<pid>) + flock ค้างไว้ตลอดอายุ process
+# -> worker อื่นไม่ replay entry ที่ยังทำอยู่ / ไม่ compact ทับกัน
+# -> flock ว่าง = เจ้าของตายแล้ว: adopt() ย้าย entry มาไฟล์ตัวเองแล้ว replay
+# ==========================================================
+
+import fcntl
+import json
+import os
+import threading
+import time
+from core.config import JOURNAL_FILE
+from core.utils import now_iso
+
+BEGIN = "BEGIN"
+WRITE = "WRITE"
+STOCK = "STOCK"
+ORDER = "ORDER"
+ABORT = "ABORT"
+
+_lock = threading.Lock()
+_owned = {"pid": None, "path": None, "fd": None}
+
+
+def _flock(lock_path, blocking=True):
+    """
+    flock ไฟล์ lock (None = มีคนถืออยู่)
+    ไฟล์ถูก adopt() ลบ/สร้างใหม่ระหว่างรอ -> เปิดใหม่ ไม่งั้นจะถือ lock ของไฟล์ที่ไม่มีแล้ว
+    """
+    while True:
+        fd = open(lock_path, "a")
+        try:
+            fcntl.flock(fd.fileno(), fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            fd.close()
+            return None
+        try:
+            if os.stat(lock_path).st_ino == os.fstat(fd.fileno()).st_ino:
+                return fd
+        except FileNotFoundError:
+            pass
+        fd.close()
+
+
+def _own_path():
+    """
+    ไฟล์ของ worker นี้ (เปิด flock ครั้งแรกที่ใช้ / หลัง fork ได้ pid ใหม่)
+    """
+    pid = os.getpid()
+    if _owned["pid"] != pid:
+        folder = os.path.dirname(JOURNAL_FILE)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+
+        path = f"{JOURNAL_FILE}.{pid}"
+        # pid ซ้ำกับ worker ที่ตายไปแล้ว -> รอ adopt() ของ worker อื่น (ถ้ามี) ปล่อยก่อน
+        fd = _flock(path + ".lock")
+        if os.path.exists(path):
+            # ไฟล์ค้างของ worker เก่า -> เปลี่ยนชื่อให้ adopt() เก็บไป ไม่ปนกับ entry ใหม่
+            os.replace(path, f"{path}.{time.time_ns()}")
+        _owned.update(pid=pid, path=path, fd=fd)
+    return _owned["path"]
+
+
+def _dump(rec):
+    return json.dumps(rec, ensure_ascii=False, separators=(",", ":")) + "\n"
+
+
+def _append(rec):
+    if not JOURNAL_FILE:
+        return
+
+    with _lock:
+        with open(_own_path(), "a", encoding="utf-8") as f:
+            f.write(_dump(rec))
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def begin(token, uid, order_id, data):
+    _append({"id": token, "op": BEGIN, "uid": uid, "order_id": order_id, "data": data, "ts": now_iso()})
+
+
+def mark(token, op):
+    _append({"id": token, "op": op, "ts": now_iso()})
+
+
+def write(token, row, before, after):
+    _append({"id": token, "op": WRITE, "row": row, "before": before, "after": after, "ts": now_iso()})
+
+
+# ----------------------------------------------------------
+# READ / REPLAY
+# ----------------------------------------------------------
+
+def _read(path):
+    entries = {}
+    if not os.path.exists(path):
+        return entries
+
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                r = json.loads(line)
+            except ValueError:
+                # บรรทัดท้ายขาดตอนตอน crash = ยังไม่ได้ commit
+                continue
+
+            op = r.get("op")
+            if op == BEGIN:
+                entries[r["id"]] = {
+                    "id": r["id"],
+                    "uid": r.get("uid", ""),
+                    "order_id": r.get("order_id", ""),
+                    "data": r.get("data") or {},
+                    "write": None,
+                    "stock_done": False,
+                }
+            elif op == WRITE and r.get("id") in entries:
+                entries[r["id"]]["write"] = {"row": r["row"], "before": r["before"], "after": r["after"]}
+            elif op == STOCK and r.get("id") in entries:
+                entries[r["id"]]["stock_done"] = True
+            elif op in (ORDER, ABORT):
+                entries.pop(r.get("id"), None)
+
+    return entries
+
+
+def _lines(e):
+    out = _dump({"id": e["id"], "op": BEGIN, "uid": e["uid"], "order_id": e["order_id"], "data": e["data"]})
+    if e["write"]:
+        out += _dump({"id": e["id"], "op": WRITE, **e["write"]})
+    if e["stock_done"]:
+        out += _dump({"id": e["id"], "op": STOCK})
+    return out
+
+
+def _orphans():
+    """
+    ไฟล์ journal ของ worker อื่น (รวมไฟล์เดี่ยวแบบเก่า <JOURNAL_FILE>)
+    """
+    folder = os.path.dirname(JOURNAL_FILE) or "."
+    base = os.path.basename(JOURNAL_FILE)
+    if not os.path.isdir(folder):
+        return []
+
+    out = []
+    for name in os.listdir(folder):
+        path = os.path.join(folder, name)
+        if path == _owned["path"]:
+            continue
+        suffix = name[len(base) + 1:].replace(".", "")
+        if name == base or (name.startswith(base + ".") and suffix.isdigit()):
+            out.append(path)
+    return out
+
+
+def adopt(on_adopt=None):
+    """
+    ย้าย entry ที่ค้างจาก worker ที่ตายแล้ว (flock ว่าง) มาไว้ในไฟล์ตัวเอง
+    worker ที่ยังทำงานอยู่ถือ flock ไว้ -> ข้าม
+    on_adopt(entry) ถูกเรียกก่อนลบไฟล์เดิม / ก่อน adopt() ของ thread อื่นจะคืนค่า
+    คืน list ของ entry ที่ย้ายมา (ให้ replay เฉพาะชุดนี้ ไม่แตะ request ที่กำลังทำอยู่)
+    """
+    if not JOURNAL_FILE:
+        return []
+
+    adopted = []
+    with _lock:
+        own = _own_path()
+        for path in _orphans():
+            fd = _flock(path + ".lock", blocking=False)
+            if fd is None:
+                continue
+
+            with fd:
+                entries = _read(path)
+                if entries:
+                    with open(own, "a", encoding="utf-8") as f:
+                        for e in entries.values():
+                            f.write(_lines(e))
+                        f.flush()
+                        os.fsync(f.fileno())
+                    adopted.extend(entries.values())
+                    for e in entries.values():
+                        if on_adopt:
+                            on_adopt(e)
+
+                # ลบไฟล์ข้อมูลก่อน lock -> worker อื่นที่ได้ lock ทีหลังจะไม่เจอข้อมูลซ้ำ
+                if os.path.exists(path):
+                    os.remove(path)
+                os.remove(path + ".lock")
+
+    return adopted
+
+
+def pending():
+    """
+    entry ที่ยังไม่จบ (ไม่มี ORDER / ABORT) ของ worker นี้ เรียงตามลำดับ BEGIN
+    คืน list ของ dict: {id, uid, order_id, data, write, stock_done}
+    """
+    if not JOURNAL_FILE:
+        return []
+
+    with _lock:
+        return list(_read(_own_path()).values())
+
+
+def compact():
+    """
+    เขียนไฟล์ใหม่ให้เหลือเฉพาะ entry ที่ยังไม่จบ
+    (อ่าน + เขียนใต้ lock เดียวกับ append -> ไม่มีบรรทัดหาย)
+    """
+    if not JOURNAL_FILE:
+        return
+
+    with _lock:
+        own = _own_path()
+        keep = _read(own)
+        tmp = own + ".tmp"
+
+        with open(tmp, "w", encoding="utf-8") as f:
+            for e in keep.values():
+                f.write(_lines(e))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, own)
@@ -5,11 +5,13 @@
 
 from core.config import WS_ORDER
 from core.utils import gen_order_id, now_iso
+from services import stats_service
 from services.sheets_service import (
     append_row,
     get_all_records,
-    find_row_by_value,
     update_row,
+    PRIORITY_CHECKOUT,
+    PRIORITY_BACKGROUND,
 )
 
 
@@ -17,12 +19,13 @@ from services.sheets_service import (
 # CREATE ORDER
 # ==========================================================
 
-def create_order(uid: str, data: dict) -> str:
+def create_order(uid: str, data: dict, order_id: str = "") -> str:
     """
     Create new order (simple version)
+    order_id: ส่งมาเองได้ (journal จองไว้ก่อน) ไม่ส่ง = สร้างใหม่
     """
 
-    order_id = gen_order_id()
+    order_id = order_id or gen_order_id()
 
     row = [
         order_id,                     # order_id
@@ -41,7 +44,21 @@ def create_order(uid: str, data: dict) -> str:
         now_iso(),                     # created_at
     ]
 
-    append_row(WS_ORDER, row)
+    append_row(WS_ORDER, row, PRIORITY_CHECKOUT)
+
+    try:
+        stats_service.on_order_created({
+            "order_id": order_id,
+            "color": row[3],
+            "size": row[4],
+            "qty": row[5],
+            "total": row[7],
+            "status": row[12],
+            "created_at": row[13],
+        })
+    except Exception as e:
+        # stats พังต้องไม่ทำให้ออเดอร์พัง (STATS:REBUILD ซ่อมได้)
+        print("stats error:", order_id, e)
 
     return order_id
 
@@ -51,7 +68,7 @@ def create_order(uid: str, data: dict) -> str:
 # ==========================================================
 
 def get_order(order_id: str):
-    rows = get_all_records(WS_ORDER)
+    rows = get_all_records(WS_ORDER, PRIORITY_BACKGROUND)
 
     for r in rows:
         if str(r.get("order_id")).strip() == str(order_id).strip():
@@ -65,15 +82,14 @@ def get_order(order_id: str):
 # ==========================================================
 
 def update_order_status(order_id: str, new_status: str):
-    row_index = find_row_by_value(WS_ORDER, "order_id", order_id)
-    if not row_index:
-        return False
-
-    rows = get_all_records(WS_ORDER)
+    # อ่านชีตครั้งเดียว ได้ทั้ง row_index และ record
+    rows = get_all_records(WS_ORDER, PRIORITY_BACKGROUND)
+    row_index = None
     target = None
 
-    for r in rows:
+    for idx, r in enumerate(rows, start=2):
         if str(r.get("order_id")).strip() == str(order_id).strip():
+            row_index = idx
             target = r
             break
 
@@ -97,6 +113,11 @@ def update_order_status(order_id: str, new_status: str):
         target.get("created_at"),
     ]
 
-    update_row(WS_ORDER, row_index, updated_row)
+    update_row(WS_ORDER, row_index, updated_row, PRIORITY_BACKGROUND)
+
+    try:
+        stats_service.on_status_changed(target, new_status)
+    except Exception as e:
+        print("stats error:", order_id, e)
 
     return True
@@ -1,19 +1,49 @@
 # ==========================================================
 # HARDY SESSION SERVICE - RENDER FREE SAFE
 # Only read one row (no get_all_records)
+# cache ผ่าน coord_service (แชร์ทุก worker) -> อ่าน Sheets เฉพาะ cache miss
 # ==========================================================
 
 import json
 import time
 from core.config import WS_SESSION
-from services.sheets_service import get_ws
+from services import coord_service as coord
+from services.sheets_service import (
+    get_all_values,
+    update_range,
+    append_row,
+    PRIORITY_SESSION,
+)
 
 SESSION_TTL = 1800
 
+# cache value "null" = รู้แล้วว่าไม่มี session
+_NONE = "null"
+
+
+def _cache_key(uid):
+    return "sess:" + uid
+
+
+def _cache_put(uid, session, ttl=SESSION_TTL):
+    coord.set_value(_cache_key(uid), json.dumps(session) if session else _NONE, ttl)
+
 
 def get_session(uid: str):
-    ws = get_ws(WS_SESSION)
-    rows = ws.get_all_values()
+    cached = coord.get_value(_cache_key(uid))
+    if cached is not None:
+        return json.loads(cached)
+
+    session = _read_session(uid)
+    if session:
+        _cache_put(uid, session, max(1, session.pop("expires") - int(time.time())))
+    else:
+        _cache_put(uid, None)
+    return session
+
+
+def _read_session(uid):
+    rows = get_all_values(WS_SESSION, PRIORITY_SESSION)
 
     now = int(time.time())
 
@@ -26,34 +56,43 @@ def get_session(uid: str):
             return {
                 "state": r[1],
                 "data": json.loads(r[2] or "{}"),
+                "expires": expires,
             }
 
     return None
 
 
 def set_session(uid: str, state: str, data: dict):
-    ws = get_ws(WS_SESSION)
-    rows = ws.get_all_values()
+    rows = get_all_values(WS_SESSION, PRIORITY_SESSION)
 
     now = int(time.time())
     expires = now + SESSION_TTL
 
     for i, r in enumerate(rows[1:], start=2):
         if r and r[0] == uid:
-            ws.update(
+            update_range(
+                WS_SESSION,
                 f"A{i}",
                 [[uid, state, json.dumps(data), now, expires]],
+                PRIORITY_SESSION,
             )
-            return
+            break
+    else:
+        append_row(WS_SESSION, [uid, state, json.dumps(data), now, expires], PRIORITY_SESSION)
 
-    ws.append_row([uid, state, json.dumps(data), now, expires])
+    _cache_put(uid, {"state": state, "data": data})
 
 
 def clear_session(uid: str):
-    ws = get_ws(WS_SESSION)
-    rows = ws.get_all_values()
+    # รู้อยู่แล้วว่าไม่มี session -> ไม่ต้องแตะ Sheets
+    if coord.get_value(_cache_key(uid)) == _NONE:
+        return
+
+    rows = get_all_values(WS_SESSION, PRIORITY_SESSION)
 
     for i, r in enumerate(rows[1:], start=2):
         if r and r[0] == uid:
-            ws.update(f"A{i}", [["", "", "", "", ""]])
-            return
+            update_range(WS_SESSION, f"A{i}", [["", "", "", "", ""]], PRIORITY_SESSION)
+            break
+
+    _cache_put(uid, None)
@@ -1,42 +1,278 @@
 # ==========================================================
 # HARDY SHEETS SERVICE - CLEAN VERSION
+# ทุก call ไป Google Sheets ผ่าน scheduler กลาง
+# - นับ quota แบบ sliding window (ต่อนาที) รวมทุก worker ผ่าน coord_service
+# - คิวตาม priority ภายใน worker: checkout > session > background
+# - 429 -> retry + backoff
+# - ต่อ Google แบบ lazy (import gspread / auth ตอนใช้ครั้งแรก)
 # ==========================================================
 
+import heapq
+import itertools
 import json
-import gspread
-from google.oauth2.service_account import Credentials
-from core.config import GOOGLE_SERVICE_ACCOUNT_JSON, SHEET_ID
+import random
+import threading
+import time
+from collections import deque
+from core.config import (
+    GOOGLE_SERVICE_ACCOUNT_JSON,
+    SHEET_ID,
+    SHEETS_QUOTA_PER_MIN,
+    SHEETS_MAX_WAIT_SECONDS,
+    SHEETS_MAX_RETRIES,
+    SHEETS_REQUEST_TIMEOUT_SECONDS,
+)
+from services import coord_service as coord
 
 SCOPES = ["https://www.googleapis.com/auth/spreadsheets"]
 
-_creds = Credentials.from_service_account_info(
-    json.loads(GOOGLE_SERVICE_ACCOUNT_JSON),
-    scopes=SCOPES,
-)
+# Priority (เลขน้อย = ได้ก่อน)
+PRIORITY_CHECKOUT = 0
+PRIORITY_SESSION = 1
+PRIORITY_BACKGROUND = 2
+
+QUOTA_WINDOW_SECONDS = 60
+QUOTA_KEY = "sheets:quota:"
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 16.0
+
+_sheet = None
+_connect_lock = threading.Lock()
+
+
+class SheetsBusyError(Exception):
+    """quota เต็มนานเกิน SHEETS_MAX_WAIT_SECONDS / 429 จน retry หมด"""
+
+
+# ----------------------------------------------------------
+# CONNECT (lazy)
+# ----------------------------------------------------------
+
+def connect():
+    """
+    auth + open spreadsheet ครั้งแรกที่ต้องใช้ (หรือจาก warm up หลัง boot)
+    """
+    global _sheet
+    if _sheet is None:
+        with _connect_lock:
+            if _sheet is None:
+                import gspread
+                from google.oauth2.service_account import Credentials
+
+                creds = Credentials.from_service_account_info(
+                    json.loads(GOOGLE_SERVICE_ACCOUNT_JSON),
+                    scopes=SCOPES,
+                )
+                client = gspread.authorize(creds)
+                # request ค้างต้องไม่เกิน call_budget_seconds() (lock ตัดสต๊อกอิงค่านี้)
+                client.set_timeout(SHEETS_REQUEST_TIMEOUT_SECONDS)
+                _sheet = client.open_by_key(SHEET_ID)
+    return _sheet
+
+
+# ----------------------------------------------------------
+# SCHEDULER
+# ----------------------------------------------------------
+
+_cond = threading.Condition()
+_calls = deque()        # monotonic ts ของ call ใน window (เฉพาะ worker นี้ ไว้ดูใน stats)
+_waiting = []           # heap ของ (priority, seq)
+_seq = itertools.count()
+_blocked_until = 0.0    # หลังโดน 429 ให้ทุกคนรอ
+
+counters = {
+    "calls": 0,
+    "waits": 0,
+    "wait_seconds": 0.0,
+    "retries_429": 0,
+    "busy_errors": 0,
+}
+
+
+def _prune(now):
+    while _calls and now - _calls[0] >= QUOTA_WINDOW_SECONDS:
+        _calls.popleft()
+
+
+def _window():
+    """
+    sliding window counter ของทุก worker: (key นาทีนี้, จำนวน call ที่ยังอยู่ใน window จากนาทีก่อน)
+    """
+    now = time.time()
+    slot = int(now // QUOTA_WINDOW_SECONDS)
+    left = 1 - (now % QUOTA_WINDOW_SECONDS) / QUOTA_WINDOW_SECONDS
+    prev = int(coord.get_value(f"{QUOTA_KEY}{slot - 1}") or 0)
+    return f"{QUOTA_KEY}{slot}", prev * left
+
+
+def _shared_used():
+    key, carried = _window()
+    return carried + int(coord.get_value(key) or 0)
+
+
+def _reserve():
+    """
+    จอง 1 call จาก quota รวม (incr ก่อนแล้วค่อยเช็ค -> worker อื่นจองพร้อมกันก็ไม่เกิน)
+    คืน 0 = ได้แล้ว, > 0 = เต็ม ลองใหม่หลังกี่วินาที
+    """
+    key, carried = _window()
+    if carried + coord.incr(key, 1, 2 * QUOTA_WINDOW_SECONDS) <= SHEETS_QUOTA_PER_MIN:
+        return 0.0
+    coord.incr(key, -1, 2 * QUOTA_WINDOW_SECONDS)
+    return QUOTA_WINDOW_SECONDS / SHEETS_QUOTA_PER_MIN
+
+
+def _acquire(priority):
+    ticket = (priority, next(_seq))
+    start = time.monotonic()
+    deadline = start + SHEETS_MAX_WAIT_SECONDS
+    waited = False
+
+    with _cond:
+        heapq.heappush(_waiting, ticket)
+        try:
+            while True:
+                now = time.monotonic()
+                _prune(now)
+
+                is_head = _waiting[0] == ticket
+                retry = 0.0
+                if is_head and now >= _blocked_until:
+                    retry = _reserve()
+                    if not retry:
+                        heapq.heappop(_waiting)
+                        _calls.append(now)
+                        counters["calls"] += 1
+                        if waited:
+                            counters["waits"] += 1
+                            counters["wait_seconds"] += now - start
+                        return
+
+                if now >= deadline:
+                    _waiting.remove(ticket)
+                    heapq.heapify(_waiting)
+                    counters["busy_errors"] += 1
+                    raise SheetsBusyError(f"Sheets quota busy (priority={priority})")
+
+                timeout = deadline - now
+                if is_head:
+                    if now < _blocked_until:
+                        timeout = min(timeout, _blocked_until - now)
+                    else:
+                        timeout = min(timeout, retry)
+
+                waited = True
+                _cond.wait(max(timeout, 0.01))
+        finally:
+            _cond.notify_all()
+
+
+def _is_quota_error(e):
+    code = getattr(e, "code", None)
+    if code is None:
+        code = getattr(getattr(e, "response", None), "status_code", None)
+    return code == 429
+
+
+def _backoff(attempt):
+    global _blocked_until
+    delay = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * (2 ** attempt))
+    delay += random.uniform(0, delay / 2)
+
+    with _cond:
+        counters["retries_429"] += 1
+        _blocked_until = max(_blocked_until, time.monotonic() + delay)
+        _cond.notify_all()
+
+
+def call_budget_seconds():
+    """
+    เวลามากสุดที่ call() หนึ่งครั้งใช้ได้ (รอ quota + request ทุก attempt + backoff)
+    """
+    backoff = sum(
+        min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * (2 ** a)) * 1.5
+        for a in range(SHEETS_MAX_RETRIES)
+    )
+    return (SHEETS_MAX_RETRIES + 1) * (SHEETS_MAX_WAIT_SECONDS + SHEETS_REQUEST_TIMEOUT_SECONDS) + backoff
+
+
+def call(fn, *args, priority=PRIORITY_SESSION, **kwargs):
+    """
+    เรียก gspread ผ่าน scheduler (รอ quota ตาม priority, retry 429)
+    """
+    for attempt in range(SHEETS_MAX_RETRIES + 1):
+        _acquire(priority)
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            # gspread APIError มี code / response.status_code
+            if not _is_quota_error(e):
+                raise
+            if attempt == SHEETS_MAX_RETRIES:
+                with _cond:
+                    counters["busy_errors"] += 1
+                raise SheetsBusyError(f"Sheets quota exceeded after {attempt} retries") from e
+            _backoff(attempt)
+
+
+def quota_stats():
+    # used / headroom = ทุก worker รวมกัน, ที่เหลือ (worker_*, counters) = เฉพาะ worker นี้
+    used = _shared_used()
+    with _cond:
+        _prune(time.monotonic())
+        return {
+            "quota_per_min": SHEETS_QUOTA_PER_MIN,
+            "used": round(used, 1),
+            "headroom": max(0, int(SHEETS_QUOTA_PER_MIN - used)),
+            "worker_used": len(_calls),
+            "waiting": len(_waiting),
+            **counters,
+        }
+
+
+# ----------------------------------------------------------
+# WORKSHEET HELPERS
+# ----------------------------------------------------------
+
+_ws_cache = {}
+
+
+def get_ws(ws_name, priority=PRIORITY_SESSION):
+    # worksheet() = metadata fetch 1 call -> cache ไว้
+    ws = _ws_cache.get(ws_name)
+    if ws is None:
+        ws = call(connect().worksheet, ws_name, priority=priority)
+        _ws_cache[ws_name] = ws
+    return ws
+
 
-_client = gspread.authorize(_creds)
-_sheet = _client.open_by_key(SHEET_ID)
+def get_all_values(ws_name, priority=PRIORITY_SESSION):
+    return call(get_ws(ws_name, priority).get_all_values, priority=priority)
 
 
-def get_ws(ws_name):
-    return _sheet.worksheet(ws_name)
+def get_all_records(ws_name, priority=PRIORITY_SESSION):
+    return call(get_ws(ws_name, priority).get_all_records, priority=priority)
 
 
-def get_all_records(ws_name):
-    return get_ws(ws_name).get_all_records()
+def append_row(ws_name, row, priority=PRIORITY_SESSION):
+    call(
+        get_ws(ws_name, priority).append_row,
+        row,
+        value_input_option="USER_ENTERED",
+        priority=priority,
+    )
 
 
-def append_row(ws_name, row):
-    get_ws(ws_name).append_row(row, value_input_option="USER_ENTERED")
+def update_range(ws_name, a1, values, priority=PRIORITY_SESSION):
+    call(get_ws(ws_name, priority).update, a1, values, priority=priority)
 
 
-def update_row(ws_name, row_index, row_values):
-    get_ws(ws_name).update(f"A{row_index}", [row_values])
+def update_row(ws_name, row_index, row_values, priority=PRIORITY_SESSION):
+    update_range(ws_name, f"A{row_index}", [row_values], priority=priority)
 
 
-def find_row_by_value(ws_name, column_name, value):
-    ws = get_ws(ws_name)
-    records = ws.get_all_records()
+def find_row_by_value(ws_name, column_name, value, priority=PRIORITY_SESSION):
+    records = get_all_records(ws_name, priority)
 
     for idx, r in enumerate(records, start=2):
         if str(r.get(column_name)).strip() == str(value).strip():
@@ -0,0 +1,242 @@
+# ==========================================================
+# HARDY STATS SERVICE - ADMIN ANALYTICS
+# aggregate รายวัน (อัปเดตทันทีตอนสร้างออเดอร์ / เปลี่ยนสถานะ)
+# - revenue, orders, units ต่อ SKU, orders ต่อ status
+# - เก็บใน coord_service (แชร์ทุก worker) -> query ไม่แตะ Sheets
+#   1 วัน = 1 hash (stats:<gen>:day:<YYYY-MM-DD>) + atomic incr ต่อ field ไม่ต้องถือ lock
+# - rebuild ได้ด้วยการอ่าน HARDY_ORDER รอบเดียว
+#   rebuild = gen ใหม่ + นับแต่ละออเดอร์ครั้งเดียวต่อ gen (set_nx) -> ชนกับ hook ก็ไม่นับซ้ำ
+#   gen เก่าลบทิ้งทั้งชุด (day hash + marker ต่อออเดอร์ ผ่าน index stats:<gen>:orders)
+# ==========================================================
+
+from datetime import datetime, timedelta
+from core.config import WS_ORDER
+from core.utils import BKK_TZ, safe_int
+from services import coord_service as coord
+from services.sheets_service import get_all_records, call_budget_seconds, PRIORITY_BACKGROUND
+
+_GEN = "stats:gen"      # gen ล่าสุด (hook เขียนเข้า gen นี้)
+_LIVE = "stats:live"    # gen ที่ rebuild เสร็จแล้ว (query อ่าน gen นี้)
+# จำ status ที่นับไว้ต่อออเดอร์ (ใช้ตอนเปลี่ยนสถานะ)
+ORDER_KEY_TTL_SECONDS = 90 * 24 * 3600
+
+
+def _day_key(gen, day):
+    return f"stats:{gen}:day:{day}"
+
+
+def _days_key(gen):
+    return f"stats:{gen}:days"
+
+
+def _order_key(gen, order_id):
+    return f"stats:{gen}:o:{order_id}"
+
+
+def _orders_key(gen):
+    # index ของ marker ใน gen นี้ (ให้ _drop ตามลบได้)
+    return f"stats:{gen}:orders"
+
+
+def _empty_day():
+    return {"revenue": 0, "orders": 0, "units": {}, "status": {}}
+
+
+def _day_of(created_at):
+    return str(created_at or "")[:10] or today()
+
+
+def _sku(color, size):
+    return f"{str(color).strip()}/{str(size).strip()}"
+
+
+def today():
+    return datetime.now(tz=BKK_TZ).date().isoformat()
+
+
+def _count(gen, r):
+    order_id = str(r.get("order_id") or "").strip()
+    status = str(r.get("status") or "NEW")
+
+    if not order_id:
+        return
+
+    # hook กับ rebuild เห็นออเดอร์เดียวกัน -> คนแรกนับ คนที่สองข้าม
+    # index ก่อน marker -> marker ทุกตัวถูก _drop เจอ
+    coord.hincr(_orders_key(gen), order_id)
+    if not coord.set_nx(_order_key(gen, order_id), status, ORDER_KEY_TTL_SECONDS):
+        return
+
+    day = _day_of(r.get("created_at"))
+    key = _day_key(gen, day)
+    qty = safe_int(str(r.get("qty", "")).strip(), 0)
+    sku = _sku(r.get("color", ""), r.get("size", ""))
+
+    coord.hincr(_days_key(gen), day)
+    coord.hincr(key, "revenue", safe_int(str(r.get("total", "")).strip(), 0))
+    coord.hincr(key, "orders")
+    coord.hincr(key, "units:" + sku, qty)
+    coord.hincr(key, "status:" + status)
+
+
+# ----------------------------------------------------------
+# INCREMENTAL (เรียกจาก order_service, ไม่มี lock -> ไม่ถ่วง checkout)
+# ----------------------------------------------------------
+
+def on_order_created(record):
+    gen = coord.get_value(_GEN)
+    if gen is None:
+        # ยังไม่เคย rebuild -> ไม่นับแบบครึ่ง ๆ กลาง ๆ
+        return
+    _count(gen, record)
+
+
+def on_status_changed(record, new_status):
+    gen = coord.get_value(_GEN)
+    order_id = str(record.get("order_id") or "").strip()
+    if gen is None or not order_id:
+        return
+
+    key = _order_key(gen, order_id)
+    old_status = coord.get_value(key)
+    if old_status is None or old_status == new_status:
+        # ยังไม่ถูกนับใน gen นี้ -> rebuild จะนับด้วย status ในชีตเอง
+        return
+
+    coord.set_value(key, new_status, ORDER_KEY_TTL_SECONDS)
+    day_key = _day_key(gen, _day_of(record.get("created_at")))
+    coord.hincr(day_key, "status:" + old_status, -1)
+    coord.hincr(day_key, "status:" + new_status)
+
+
+# ----------------------------------------------------------
+# REBUILD (อ่าน HARDY_ORDER รอบเดียว)
+# ----------------------------------------------------------
+
+def _drop(gen):
+    for day in coord.hgetall(_days_key(gen)):
+        coord.delete(_day_key(gen, day))
+    coord.delete(_days_key(gen))
+
+    for order_id in coord.hgetall(_orders_key(gen)):
+        coord.delete(_order_key(gen, order_id))
+    coord.delete(_orders_key(gen))
+
+
+def rebuild():
+    """
+    นับใหม่ลง gen ใหม่ แล้วสลับให้ query อ่าน gen นั้น
+    ออเดอร์ที่สร้างระหว่าง rebuild: hook เขียนเข้า gen ใหม่อยู่แล้ว (set_nx กันนับซ้ำ)
+    rebuild ซ้อนกัน -> LockTimeout
+    """
+    with coord.lock(_GEN, ttl=2 * call_budget_seconds(), wait=0):
+        old = coord.get_value(_LIVE)
+        gen = str(coord.incr(_GEN))
+
+        for r in get_all_records(WS_ORDER, PRIORITY_BACKGROUND):
+            _count(gen, r)
+
+        coord.set_value(_LIVE, gen)
+        # gen live เดิม + gen ที่ rebuild พังกลางทาง (ไม่เคย live)
+        for g in range(int(old or 0), int(gen)):
+            if g:
+                _drop(str(g))
+
+    return len(coord.hgetall(_days_key(gen)))
+
+
+def ensure_built():
+    # rebuild ครั้งก่อนพังกลางทาง (gen ใหม่ยังไม่ live) -> ทำใหม่
+    live = coord.get_value(_LIVE)
+    if live is None or live != coord.get_value(_GEN):
+        try:
+            rebuild()
+        except coord.LockTimeout:
+            # worker อื่นกำลัง rebuild อยู่
+            pass
+
+
+# ----------------------------------------------------------
+# QUERY (ไม่แตะ Sheets)
+# ----------------------------------------------------------
+
+def day_stats(day=None):
+    out = _empty_day()
+    gen = coord.get_value(_LIVE)
+    if gen is None:
+        return out
+
+    for field, v in coord.hgetall(_day_key(gen, day or today())).items():
+        if field in ("revenue", "orders"):
+            out[field] = v
+        elif field.startswith("units:") and v:
+            out["units"][field[len("units:"):]] = v
+        elif field.startswith("status:") and v:
+            out["status"][field[len("status:"):]] = v
+
+    return out
+
+
+def range_stats(n_days=7, end_day=None):
+    """
+    รวม n_days ย้อนหลัง (นับ end_day ด้วย)
+    """
+    end = datetime.fromisoformat(end_day or today()).date()
+    out = _empty_day()
+
+    for i in range(n_days):
+        d = day_stats((end - timedelta(days=i)).isoformat())
+        out["revenue"] += d["revenue"]
+        out["orders"] += d["orders"]
+        for k, v in d["units"].items():
+            out["units"][k] = out["units"].get(k, 0) + v
+        for k, v in d["status"].items():
+            out["status"][k] = out["status"].get(k, 0) + v
+
+    return out
+
+
+def sku_stats(sku, n_days=7, end_day=None):
+    """
+    จำนวนต่อวันของ SKU เดียว (เทียบแบบไม่สนตัวพิมพ์ / ช่องว่างรอบ ๆ)
+    คืน [(day, units)] เรียงจากวันเก่าไปใหม่
+    """
+    color, _, size = sku.partition("/")
+    want = _sku(color, size).lower()
+    end = datetime.fromisoformat(end_day or today()).date()
+
+    out = []
+    for i in reversed(range(n_days)):
+        day = (end - timedelta(days=i)).isoformat()
+        units = sum(v for k, v in day_stats(day)["units"].items() if k.lower() == want)
+        out.append((day, units))
+    return out
+
+
+def format_sku_stats(sku, rows):
+    lines = [f"📊 {sku} ({len(rows)} วันล่าสุด)"]
+    lines += [f"- {day}: {n}" for day, n in rows]
+    lines.append(f"รวม: {sum(n for _, n in rows)} ตัว")
+    return "\n".join(lines)
+
+
+def format_stats(title, s):
+    lines = [
+        f"📊 {title}",
+        f"ออเดอร์: {s['orders']}",
+        f"ยอดขาย: {s['revenue']} บาท",
+    ]
+
+    if s["units"]:
+        lines.append("")
+        lines.append("จำนวนต่อ SKU:")
+        for sku, n in sorted(s["units"].items(), key=lambda x: -x[1]):
+            lines.append(f"- {sku}: {n}")
+
+    if s["status"]:
+        lines.append("")
+        lines.append("สถานะ:")
+        for st, n in sorted(s["status"].items()):
+            lines.append(f"- {st}: {n}")
+
+    return "\n".join(lines)
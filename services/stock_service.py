@@ -1,19 +1,60 @@
 # ==========================================================
 # HARDY STOCK SERVICE - FIXED VERSION
 # ลดสต๊อกจริง
+# - อ่าน catalog จาก cache (ต่อ worker) จนกว่า version ใน coord เปลี่ยน
+# - ตัด/คืนสต๊อกใต้ lock ข้าม worker แล้ว invalidate ทุก worker
+# - บันทึก intent (row, before, after) ใน coord ก่อนเขียน
+#   เขียนแล้วไม่รู้ผล (timeout / worker ตาย) -> คนถัดไปที่ถือ lock เทียบค่าให้
 # ==========================================================
 
-from core.config import WS_STOCK
-from services.sheets_service import get_ws
+import json
+import time
+from core.config import WS_STOCK, STOCK_CACHE_SECONDS
+from services import coord_service as coord
+from services.sheets_service import (
+    get_all_values,
+    update_range,
+    call_budget_seconds,
+    SheetsBusyError,
+    PRIORITY_SESSION,
+    PRIORITY_CHECKOUT,
+)
+
+# ผลการเขียนของแต่ละ ref (confirm_token) เก็บไว้ให้ replay / กดซ้ำมาถาม
+SETTLE_TTL_SECONDS = 7 * 24 * 3600
+
+_cache = {"rows": None, "version": None, "at": 0.0}
+
+
+class StockWriteUnknown(Exception):
+    """เรียก update แล้วพัง ไม่รู้ว่า Google เขียนลงไปหรือยัง"""
 
 
 def _normalize(s):
     return str(s).strip()
 
 
+def _sku(color, size):
+    return f"stock:{_normalize(color)}:{_normalize(size)}"
+
+
+def _rows():
+    """
+    แถวสต๊อก (ไม่รวม header) สำหรับหน้าเลือกสินค้า
+    """
+    ver = coord.version(WS_STOCK)
+    fresh = time.monotonic() - _cache["at"] < STOCK_CACHE_SECONDS
+
+    if _cache["rows"] is None or _cache["version"] != ver or not fresh:
+        _cache["rows"] = get_all_values(WS_STOCK, PRIORITY_SESSION)[1:]
+        _cache["version"] = ver
+        _cache["at"] = time.monotonic()
+
+    return _cache["rows"]
+
+
 def get_available_colors():
-    ws = get_ws(WS_STOCK)
-    rows = ws.get_all_values()[1:]
+    rows = _rows()
 
     colors = set()
     for r in rows:
@@ -24,8 +65,7 @@ def get_available_colors():
 
 
 def get_available_sizes(color):
-    ws = get_ws(WS_STOCK)
-    rows = ws.get_all_values()[1:]
+    rows = _rows()
 
     sizes = []
     for r in rows:
@@ -36,8 +76,7 @@ def get_available_sizes(color):
 
 
 def get_stock(color, size):
-    ws = get_ws(WS_STOCK)
-    rows = ws.get_all_values()[1:]
+    rows = _rows()
 
     for r in rows:
         if _normalize(r[0]) == _normalize(color) and _normalize(r[1]) == _normalize(size):
@@ -47,8 +86,7 @@ def get_stock(color, size):
 
 
 def get_price(color, size):
-    ws = get_ws(WS_STOCK)
-    rows = ws.get_all_values()[1:]
+    rows = _rows()
 
     for r in rows:
         if _normalize(r[0]) == _normalize(color) and _normalize(r[1]) == _normalize(size):
@@ -57,9 +95,87 @@ def get_price(color, size):
     return 0
 
 
-def deduct_stock(color, size, qty):
-    ws = get_ws(WS_STOCK)
-    rows = ws.get_all_values()
+# ----------------------------------------------------------
+# WRITE INTENT
+# ----------------------------------------------------------
+
+def _intent_key(color, size):
+    return "intent:" + _sku(color, size)
+
+
+def _resolve(ref, applied):
+    coord.set_value("stockw:" + ref, "1" if applied else "0", SETTLE_TTL_SECONDS)
+
+
+def _settle(color, size, rows):
+    """
+    ปิด intent ที่ค้างของ SKU นี้ (เรียกใต้ lock หลังอ่านสด)
+    ไม่มีใครเขียนแทรกได้ตั้งแต่ intent -> ค่าในชีตบอกได้ว่าเขียนลงหรือยัง
+    """
+    key = _intent_key(color, size)
+    raw = coord.get_value(key)
+    if not raw:
+        return
+
+    w = json.loads(raw)
+    row = rows[w["row"] - 1] if len(rows) >= w["row"] else []
+    value = int(row[2]) if len(row) > 2 else None
+
+    if value == w["after"]:
+        _resolve(w["ref"], True)
+    elif value == w["before"]:
+        _resolve(w["ref"], False)
+    else:
+        # มีคนแก้ชีตเอง -> บอกไม่ได้
+        coord.set_value("stockw:" + w["ref"], "?", SETTLE_TTL_SECONDS)
+        print("WARN: stock intent unresolved, please check stock:", color, size, w)
+
+    coord.delete(key)
+
+
+def settle_stock(color, size, ref, write=None):
+    """
+    การตัดสต๊อกของ ref ลงชีตหรือยัง: True / False / None (บอกไม่ได้)
+    write = intent จาก journal ใช้เทียบเองถ้า coord ไม่มีข้อมูล (เช่น memory backend หลัง restart)
+    """
+    with coord.lock(_sku(color, size), ttl=call_budget_seconds()):
+        rows = get_all_values(WS_STOCK, PRIORITY_CHECKOUT)
+        _settle(color, size, rows)
+
+        result = coord.get_value("stockw:" + ref)
+        if result:
+            return {"1": True, "0": False}.get(result)
+
+        if not write:
+            return False
+
+        row = rows[write["row"] - 1] if len(rows) >= write["row"] else []
+        value = int(row[2]) if len(row) > 2 else None
+        if value == write["after"]:
+            return True
+        if value == write["before"]:
+            return False
+        return None
+
+
+# ----------------------------------------------------------
+# DEDUCT / RESTORE
+# ----------------------------------------------------------
+
+def deduct_stock(color, size, qty, ref="", on_write=None):
+    """
+    ref      = confirm_token (ใช้ถามผลภายหลังด้วย settle_stock)
+    on_write = callback(row, before, after) ก่อนเขียน (เช่น journal)
+    """
+    # อายุ lock >= เวลาที่อ่านสดใช้ได้มากสุด (รอ quota + retry 429)
+    with coord.lock(_sku(color, size), ttl=call_budget_seconds()) as lk:
+        return _deduct_stock(lk, color, size, qty, ref, on_write)
+
+
+def _deduct_stock(lk, color, size, qty, ref="", on_write=None):
+    # อ่านสดใต้ lock เสมอ (ห้ามใช้ cache ตอนตัดสต๊อก)
+    rows = get_all_values(WS_STOCK, PRIORITY_CHECKOUT)
+    _settle(color, size, rows)
 
     for idx, r in enumerate(rows[1:], start=2):
 
@@ -74,8 +190,68 @@ def deduct_stock(color, size, qty):
 
             new_stock = current_stock - qty
 
+            # ยังถือ lock อยู่ไหม + ต่ออายุให้พอสำหรับการเขียน (หลุดแล้ว = มีคนอ่าน/เขียนแทรกได้ ห้ามเขียน)
+            lk.extend(call_budget_seconds())
+
+            if on_write:
+                on_write(idx, current_stock, new_stock)
+            if ref:
+                coord.set_value(
+                    _intent_key(color, size),
+                    json.dumps({"ref": ref, "row": idx, "before": current_stock, "after": new_stock}),
+                    SETTLE_TTL_SECONDS,
+                )
+
             # update stock column (C)
-            ws.update(f"C{idx}", [[new_stock]])
+            try:
+                update_range(WS_STOCK, f"C{idx}", [[new_stock]], PRIORITY_CHECKOUT)
+            except SheetsBusyError:
+                # 429 = Google ไม่ได้เขียน
+                if ref:
+                    _resolve(ref, False)
+                    coord.delete(_intent_key(color, size))
+                raise
+            except Exception as e:
+                # intent ค้างไว้ใน coord ให้ _settle ตัดสิน
+                raise StockWriteUnknown(f"{color}/{size} row {idx}") from e
+
+            # เขียนลงแล้ว -> coord พังหลังจากนี้ต้องไม่ทำให้ออเดอร์ถูกยกเลิก
+            try:
+                if ref:
+                    _resolve(ref, True)
+                    coord.delete(_intent_key(color, size))
+                coord.invalidate(WS_STOCK)
+            except Exception as e:
+                print("stock post-write coord error:", color, size, e)
+
+            return True, new_stock
+
+    return False, 0
+
+
+def restore_stock(color, size, qty):
+    """
+    คืนสต๊อก (เช่น ยกเลิกออเดอร์)
+    """
+    with coord.lock(_sku(color, size), ttl=call_budget_seconds()) as lk:
+        return _restore_stock(lk, color, size, qty)
+
+
+def _restore_stock(lk, color, size, qty):
+    rows = get_all_values(WS_STOCK, PRIORITY_CHECKOUT)
+    _settle(color, size, rows)
+
+    for idx, r in enumerate(rows[1:], start=2):
+
+        if (
+            _normalize(r[0]) == _normalize(color)
+            and _normalize(r[1]) == _normalize(size)
+        ):
+            new_stock = int(r[2]) + qty
+
+            lk.extend(call_budget_seconds())
+            update_range(WS_STOCK, f"C{idx}", [[new_stock]], PRIORITY_CHECKOUT)
+            coord.invalidate(WS_STOCK)
 
             return True, new_stock
 
@@ -0,0 +1,80 @@
+# ==========================================================
+# HARDY TESTS - FIXTURES
+# ใช้ fake Sheets / LINE ชุดเดียวกับ scripts/loadtest.py (ไม่หน่วง ไม่ติด quota)
+# env ต้องตั้งก่อน import service ใด ๆ (core/config.py อ่านตอน import)
+# ==========================================================
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "scripts"))
+
+import loadtest  # noqa: E402
+
+WORKDIR = tempfile.mkdtemp(prefix="hardy-test-")
+loadtest._setup_env(argparse.Namespace(quota=100000, coord="memory", real_rate_limit=False), WORKDIR)
+
+from integrations import line_api  # noqa: E402
+from services import coord_service as coord  # noqa: E402
+from services import idempotency_service, journal_service, sheets_service, stock_service  # noqa: E402
+
+
+def _reset_workdir():
+    for name in os.listdir(WORKDIR):
+        path = os.path.join(WORKDIR, name)
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        else:
+            os.remove(path)
+
+
+@pytest.fixture
+def line():
+    fake = loadtest.FakeLine(latency_ms=0)
+    line_api._post = fake.post
+    return fake
+
+
+@pytest.fixture
+def sheet(line):
+    """
+    process ใหม่เอี่ยม: coord (memory) ว่าง, journal / idempotency ไม่มีไฟล์
+    """
+    _reset_workdir()
+    coord._backend = None
+    journal_service._owned.update(pid=None, path=None, fd=None)
+    idempotency_service._index.clear()
+    idempotency_service._in_flight.clear()
+    idempotency_service._loaded = False
+    stock_service._cache.update(rows=None, version=None, at=0.0)
+    sheets_service._ws_cache.clear()
+
+    rows = [[c, s, "3", "1290"] for c in loadtest.COLORS for s in loadtest.SIZES]
+    fake = loadtest.FakeSpreadsheet(rows, latency_ms=0, jitter_ms=0, quota_per_min=100000)
+    sheets_service._sheet = fake
+    yield fake
+
+    if journal_service._owned["fd"]:
+        journal_service._owned["fd"].close()
+    journal_service._owned.update(pid=None, path=None, fd=None)
+
+
+def stock_of(sheet, color, size):
+    for r in sheet.sheets["HARDY_STOCK"][1:]:
+        if r[0] == color and r[1] == size:
+            return int(r[2])
+    return None
+
+
+def stock_row(sheet, color, size):
+    for idx, r in enumerate(sheet.sheets["HARDY_STOCK"][1:], start=2):
+        if r[0] == color and r[1] == size:
+            return idx
+    return None
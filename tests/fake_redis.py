@@ -0,0 +1,206 @@
+# ==========================================================
+# HARDY TESTS - FAKE REDIS
+# RESP server ใน process เดียวกัน (thread) เฉพาะคำสั่งที่ RedisBackend ใช้
+# EVAL รู้จักเฉพาะ script ของ coord_service (เทียบข้อความตรง ๆ)
+# ==========================================================
+
+import socketserver
+import threading
+import time
+
+from services import coord_service as coord
+
+
+class _Error(Exception):
+    pass
+
+
+class _Status(str):
+    """simple string reply (+OK) แยกจาก bulk string"""
+
+
+class FakeRedis:
+    def __init__(self, password=None):
+        self.password = password
+        self.connections = 0
+        self._data = {}   # key -> [value, expires_at | None]
+        self._lock = threading.Lock()
+        self._handlers = []
+
+        fake = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                with fake._lock:
+                    fake.connections += 1
+                    fake._handlers.append(self)
+                authed = fake.password is None
+                while True:
+                    try:
+                        args = fake._read_command(self.rfile)
+                    except (OSError, ValueError):
+                        return
+                    if args is None:
+                        return
+                    try:
+                        if args[0].upper() == "AUTH":
+                            if args[1] != fake.password:
+                                raise _Error("WRONGPASS invalid password")
+                            authed = True
+                            reply = _Status("OK")
+                        elif not authed:
+                            raise _Error("NOAUTH Authentication required.")
+                        else:
+                            reply = fake._execute(args)
+                    except _Error as e:
+                        reply = _Error(str(e))
+                    try:
+                        self.wfile.write(fake._encode(reply))
+                    except OSError:
+                        return
+
+        self._server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self.url = f"redis://127.0.0.1:{self._server.server_address[1]}/0"
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.drop_connections()
+        self._server.shutdown()
+        self._server.server_close()
+
+    def flush(self):
+        with self._lock:
+            self._data.clear()
+
+    def drop_connections(self):
+        """
+        จำลอง server restart / connection หลุด (client ต้อง reconnect เอง)
+        """
+        with self._lock:
+            handlers, self._handlers = self._handlers, []
+        for h in handlers:
+            try:
+                h.request.shutdown(2)
+            except OSError:
+                pass
+
+    # ------------------------------------------------------
+    # RESP
+    # ------------------------------------------------------
+
+    def _read_command(self, rfile):
+        line = rfile.readline()
+        if not line:
+            return None
+        n = int(line[1:-2])
+        args = []
+        for _ in range(n):
+            size = int(rfile.readline()[1:-2])
+            args.append(rfile.read(size + 2)[:-2].decode())
+        return args
+
+    def _encode(self, v):
+        if isinstance(v, _Error):
+            return b"-" + str(v).encode() + b"\r\n"
+        if v is None:
+            return b"$-1\r\n"
+        if isinstance(v, _Status):
+            return b"+" + v.encode() + b"\r\n"
+        if isinstance(v, bool):
+            v = int(v)
+        if isinstance(v, int):
+            return b":%d\r\n" % v
+        if isinstance(v, list):
+            return b"*%d\r\n" % len(v) + b"".join(self._encode(x) for x in v)
+        b = str(v).encode()
+        return b"$%d\r\n%s\r\n" % (len(b), b)
+
+    # ------------------------------------------------------
+    # COMMANDS
+    # ------------------------------------------------------
+
+    def _get(self, key, kind=None):
+        item = self._data.get(key)
+        if item and item[1] is not None and item[1] <= time.time():
+            del self._data[key]
+            return None
+        if item and kind is not None and not isinstance(item[0], kind):
+            raise _Error("WRONGTYPE Operation against a key holding the wrong kind of value")
+        return item
+
+    def _execute(self, args):
+        cmd, rest = args[0].upper(), args[1:]
+        with self._lock:
+            if cmd == "EVAL":
+                return self._eval(rest[0], rest[2:2 + int(rest[1])], rest[2 + int(rest[1]):])
+            return getattr(self, "_cmd_" + cmd.lower(), self._unknown)(*rest)
+
+    def _unknown(self, *args):
+        raise _Error("ERR unknown command")
+
+    def _eval(self, script, keys, argv):
+        key = keys[0]
+        if script == coord._DEL_IF_SCRIPT:
+            return self._cmd_del(key) if self._cmd_get(key) == argv[0] else 0
+        if script == coord._EXPIRE_IF_SCRIPT:
+            return self._cmd_pexpire(key, argv[1]) if self._cmd_get(key) == argv[0] else 0
+        if script == coord._POP_ALL_SCRIPT:
+            item = self._get(key, list)
+            self._data.pop(key, None)
+            return list(item[0]) if item else []
+        raise _Error("ERR unknown script")
+
+    def _cmd_ping(self):
+        return _Status("PONG")
+
+    def _cmd_select(self, db):
+        return _Status("OK")
+
+    def _cmd_get(self, key):
+        item = self._get(key, str)
+        return item[0] if item else None
+
+    def _cmd_set(self, key, value, *opts):
+        opts = [o.upper() for o in opts]
+        if "NX" in opts and self._get(key):
+            return None
+        exp = None
+        if "PX" in opts:
+            exp = time.time() + int(opts[opts.index("PX") + 1]) / 1000
+        self._data[key] = [value, exp]
+        return _Status("OK")
+
+    def _cmd_del(self, *keys):
+        return sum(1 for k in keys if self._get(k) and self._data.pop(k, None))
+
+    def _cmd_pexpire(self, key, ms):
+        item = self._get(key)
+        if not item:
+            return 0
+        item[1] = time.time() + int(ms) / 1000
+        return 1
+
+    def _cmd_incrby(self, key, by):
+        item = self._get(key, str)
+        n = int(item[0] if item else 0) + int(by)
+        self._data[key] = [str(n), item[1] if item else None]
+        return n
+
+    def _cmd_hincrby(self, key, field, by):
+        item = self._get(key, dict)
+        if not item:
+            item = self._data[key] = [{}, None]
+        item[0][field] = item[0].get(field, 0) + int(by)
+        return item[0][field]
+
+    def _cmd_hgetall(self, key):
+        item = self._get(key, dict)
+        return [x for f, v in (item[0].items() if item else []) for x in (f, str(v))]
+
+    def _cmd_rpush(self, key, *values):
+        item = self._get(key, list)
+        if not item:
+            item = self._data[key] = [[], None]
+        item[0].extend(values)
+        return len(item[0])
@@ -0,0 +1,95 @@
+import os
+import time
+
+import pytest
+
+from conftest import WORKDIR
+from fake_redis import FakeRedis
+from services import coord_service as coord
+
+
+@pytest.fixture(scope="module")
+def redis_server():
+    server = FakeRedis(password="secret")
+    yield server
+    server.close()
+
+
+@pytest.fixture(params=["memory", "sqlite", "redis"])
+def backend(request, monkeypatch):
+    if request.param == "sqlite":
+        path = os.path.join(WORKDIR, f"coord-{time.time_ns()}.db")
+        b = coord.SQLiteBackend(path)
+    elif request.param == "redis":
+        server = request.getfixturevalue("redis_server")
+        server.flush()
+        b = coord.RedisBackend(server.url.replace("redis://", "redis://:secret@"))
+    else:
+        b = coord.MemoryBackend()
+    monkeypatch.setattr(coord, "_backend", b)
+    return b
+
+
+def test_set_nx_and_ttl(backend):
+    assert backend.set_nx("k", "a", 0.2)
+    assert not backend.set_nx("k", "b", 0.2)
+    assert backend.get("k") == "a"
+    time.sleep(0.3)
+    assert backend.get("k") is None
+    assert backend.set_nx("k", "c")
+    backend.delete("k", only_if="x")
+    assert backend.get("k") == "c"
+    backend.delete("k", only_if="c")
+    assert backend.get("k") is None
+
+
+def test_lock_excludes_and_extend_detects_loss(backend):
+    with coord.lock("sku", ttl=0.2) as lk:
+        with pytest.raises(coord.LockTimeout):
+            with coord.lock("sku", wait=0):
+                pass
+        lk.extend(0.2)
+        time.sleep(0.3)
+        # หมดอายุแล้วมีคนอื่นถือแทน -> extend ต้องไม่ต่ออายุให้
+        with coord.lock("sku", wait=0):
+            with pytest.raises(coord.LockLost):
+                lk.extend(5)
+
+    with coord.lock("sku", wait=0):
+        pass
+
+
+def test_incr_and_hincr(backend):
+    assert backend.incr("n") == 1
+    assert backend.incr("n", 4) == 5
+    assert backend.incr("n", -2, ttl=0.2) == 3
+    time.sleep(0.3)
+    assert backend.incr("n") == 1
+
+    backend.hincr("h", "orders")
+    backend.hincr("h", "revenue", 1290)
+    backend.hincr("h", "orders")
+    assert backend.hgetall("h") == {"orders": 2, "revenue": 1290}
+    backend.delete("h")
+    assert backend.hgetall("h") == {}
+
+
+def test_rpush_pop_all(backend):
+    assert backend.pop_all("l") == []
+    backend.rpush("l", "a", 5)
+    backend.rpush("l", "ข้อความ", 5)
+    assert backend.pop_all("l") == ["a", "ข้อความ"]
+    assert backend.pop_all("l") == []
+
+
+def test_redis_reconnect_closes_old_socket(redis_server):
+    b = coord.RedisBackend(redis_server.url.replace("redis://", "redis://:secret@"))
+    b.set("reconnect", "1")
+    old_sock, old_buf = b._local.sock, b._local.buf
+
+    redis_server.drop_connections()
+
+    assert b.get("reconnect") == "1"
+    assert b._local.sock is not old_sock
+    assert old_sock.fileno() == -1
+    assert old_buf.closed
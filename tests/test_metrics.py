@@ -0,0 +1,26 @@
+import pytest
+
+pytest.importorskip("flask")
+
+import app as app_module  # noqa: E402
+from core import security  # noqa: E402
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(security, "METRICS_TOKEN", "s3cret")
+    return app_module.app.test_client()
+
+
+def test_metrics_requires_token(client):
+    assert client.get("/metrics").status_code == 403
+    assert client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 403
+
+    r = client.get("/metrics", headers={"Authorization": "Bearer s3cret"})
+    assert r.status_code == 200
+    assert "sheets" in r.get_json()
+
+
+def test_metrics_disabled_without_token(client, monkeypatch):
+    monkeypatch.setattr(security, "METRICS_TOKEN", "")
+    assert client.get("/metrics", headers={"Authorization": "Bearer "}).status_code == 403
@@ -0,0 +1,107 @@
+import json
+import os
+
+from conftest import stock_of, stock_row
+from core.config import JOURNAL_FILE
+from features import order_flow
+from services import journal_service as journal
+from services.session_service import set_session
+
+UID = "UTEST000001"
+TOKEN = "tok-retap"
+ORDER_ID = "HD-DEAD-0001"
+DATA = {
+    "color": "Navy", "size": "M", "qty": 1, "price": 1290, "total": 1290,
+    "name": "ลูกค้า", "phone": "0812345678", "address": "99/9", "confirm_token": TOKEN,
+}
+
+
+def _dead_worker_journal(sheet, applied):
+    """
+    worker pid อื่นตายหลัง journal WRITE (ชีตถูกเขียนแล้วหรือยังแล้วแต่ applied)
+    """
+    row = stock_row(sheet, "Navy", "M")
+    before = stock_of(sheet, "Navy", "M")
+    after = before - DATA["qty"]
+    lines = [
+        {"id": TOKEN, "op": journal.BEGIN, "uid": UID, "order_id": ORDER_ID, "data": DATA},
+        {"id": TOKEN, "op": journal.WRITE, "row": row, "before": before, "after": after},
+    ]
+    with open(f"{JOURNAL_FILE}.999999", "w", encoding="utf-8") as f:
+        for r in lines:
+            f.write(json.dumps(r, ensure_ascii=False) + "\n")
+    if applied:
+        sheet.sheets["HARDY_STOCK"][row - 1][2] = str(after)
+
+
+def _retap(line, n):
+    reply_token = f"rt-{n}"
+    order_flow.handle(UID, reply_token, f"BOT:FINAL_CONFIRM:{TOKEN}")
+    return "\n".join(m.get("text", "") for m in line.take(reply_token))
+
+
+def test_retap_after_crash_resumes_instead_of_deducting_again(sheet, line):
+    # restart: memory coord ว่าง (claim หาย) และ replay ตอน boot ยังไม่ทัน adopt
+    _dead_worker_journal(sheet, applied=True)
+    set_session(UID, "WAIT_FINAL_CONFIRM", DATA)
+
+    text = _retap(line, 1)
+
+    assert ORDER_ID in text
+    assert stock_of(sheet, "Navy", "M") == 2
+    orders = sheet.sheets["HARDY_ORDER"][1:]
+    assert [r[0] for r in orders] == [ORDER_ID]
+    assert not os.path.exists(f"{JOURNAL_FILE}.999999")
+    assert journal.pending() == []
+
+
+def test_retap_after_crash_before_write_starts_fresh(sheet, line):
+    _dead_worker_journal(sheet, applied=False)
+    set_session(UID, "WAIT_FINAL_CONFIRM", DATA)
+
+    text = _retap(line, 1)
+
+    # entry เก่ายกเลิก (ยังไม่ได้เขียน) -> กดครั้งนี้ตัดสต๊อกครั้งเดียว
+    assert "ORDER ID:" in text
+    assert stock_of(sheet, "Navy", "M") == 2
+    assert len(sheet.sheets["HARDY_ORDER"]) == 2
+
+
+def test_create_order_error_holds_token_and_asks_to_retap(sheet, line, monkeypatch):
+    set_session(UID, "WAIT_FINAL_CONFIRM", DATA)
+
+    def broken(*args, **kwargs):
+        raise RuntimeError("append failed")
+
+    monkeypatch.setattr(order_flow, "create_order", broken)
+    order_flow.handle(UID, "rt-1", f"BOT:FINAL_CONFIRM:{TOKEN}")
+    replies = line.take("rt-1")
+
+    # ลูกค้าได้คำตอบ + ปุ่มยืนยันเดิม, token ยังถูก hold
+    buttons = [i["action"]["data"] for m in replies for i in (m.get("quickReply") or {}).get("items", [])]
+    assert f"BOT:FINAL_CONFIRM:{TOKEN}" in buttons
+    assert order_flow.held(TOKEN)["stock_done"] is True
+    assert stock_of(sheet, "Navy", "M") == 2
+
+    monkeypatch.undo()
+    text = _retap(line, 2)
+
+    assert "ORDER ID:" in text
+    assert stock_of(sheet, "Navy", "M") == 2
+    assert len(sheet.sheets["HARDY_ORDER"]) == 2
+
+
+def test_unknown_write_keeps_token_held(sheet, line):
+    _dead_worker_journal(sheet, applied=False)
+    # ค่าในชีตไม่ตรงทั้ง before / after -> บอกไม่ได้ว่าเขียนลงไปหรือยัง
+    sheet.sheets["HARDY_STOCK"][stock_row(sheet, "Navy", "M") - 1][2] = "7"
+    set_session(UID, "WAIT_FINAL_CONFIRM", DATA)
+
+    for n in range(2):
+        text = _retap(line, n)
+        assert "ORDER ID:" not in text
+        assert stock_of(sheet, "Navy", "M") == 7
+
+    assert order_flow.held(TOKEN)["id"] == TOKEN
+    assert len(sheet.sheets["HARDY_ORDER"]) == 1
+    assert [e["id"] for e in journal.pending()] == [TOKEN]
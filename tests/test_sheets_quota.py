@@ -0,0 +1,36 @@
+import os
+
+import pytest
+
+from conftest import WORKDIR
+from services import coord_service as coord
+from services import sheets_service
+
+
+@pytest.fixture
+def shared_quota(monkeypatch):
+    monkeypatch.setattr(coord, "_backend", coord.SQLiteBackend(os.path.join(WORKDIR, "quota.db")))
+    monkeypatch.setattr(sheets_service, "SHEETS_QUOTA_PER_MIN", 3)
+    monkeypatch.setattr(sheets_service, "SHEETS_MAX_WAIT_SECONDS", 0.2)
+    sheets_service._calls.clear()
+    yield
+    sheets_service._calls.clear()
+
+
+def _new_worker():
+    # worker อื่น = scheduler ในหน่วยความจำว่าง แต่ coord เดียวกัน
+    sheets_service._calls.clear()
+
+
+def test_quota_is_shared_across_workers(shared_quota):
+    for _ in range(2):
+        sheets_service.call(lambda: None)
+
+    _new_worker()
+    sheets_service.call(lambda: None)
+    with pytest.raises(sheets_service.SheetsBusyError):
+        sheets_service.call(lambda: None)
+
+    stats = sheets_service.quota_stats()
+    assert stats["headroom"] == 0
+    assert stats["worker_used"] == 1
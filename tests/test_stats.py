@@ -0,0 +1,60 @@
+from features.order_flow import admin_stats
+from services import coord_service as coord
+from services import stats_service
+
+
+def _order(sheet, order_id, color, size, qty, day):
+    sheet.sheets["HARDY_ORDER"].append([
+        order_id, "U1", "tok-" + order_id, color, size, str(qty), "1290", str(1290 * qty),
+        "n", "p", "a", "UNPAID", "NEW", f"{day} 10:00:00",
+    ])
+
+
+def _stats_keys():
+    b = coord.backend()
+    return sorted(k for k in list(b._data) + list(b._hash) if k.startswith("stats:") and k not in ("stats:gen", "stats:live"))
+
+
+def test_rebuild_drops_previous_generation_markers(sheet):
+    day = stats_service.today()
+    _order(sheet, "HD-1", "Navy", "M", 2, day)
+    _order(sheet, "HD-2", "Black", "L", 1, day)
+
+    stats_service.rebuild()
+    first = _stats_keys()
+    for _ in range(3):
+        stats_service.rebuild()
+
+    # ไม่สะสมตามจำนวนครั้งที่ rebuild
+    assert len(_stats_keys()) == len(first)
+    assert all(k.startswith(f"stats:{coord.get_value('stats:live')}:") for k in _stats_keys())
+    assert stats_service.day_stats()["orders"] == 2
+
+
+def test_rebuild_drops_generation_left_by_crashed_rebuild(sheet):
+    day = stats_service.today()
+    _order(sheet, "HD-1", "Navy", "M", 2, day)
+    stats_service.rebuild()
+
+    # rebuild พังหลัง incr gen (gen ใหม่ไม่เคย live) แต่ hook เขียนเข้าไปแล้ว
+    crashed = str(coord.incr("stats:gen"))
+    stats_service.on_order_created({"order_id": "HD-9", "color": "Navy", "size": "M", "qty": 1, "total": 1290, "created_at": day})
+
+    stats_service.ensure_built()
+
+    assert not any(k.startswith(f"stats:{crashed}:") for k in _stats_keys())
+
+
+def test_stats_sku_filter(sheet):
+    day = stats_service.today()
+    _order(sheet, "HD-1", "Navy", "M", 2, day)
+    _order(sheet, "HD-2", "Navy", "M", 1, day)
+    _order(sheet, "HD-3", "Black", "L", 5, day)
+    stats_service.rebuild()
+
+    text = admin_stats("STATS:SKU:navy/m")
+
+    assert f"- {day}: 3" in text
+    assert "รวม: 3 ตัว" in text
+    assert "Black" not in text
+    assert "STATS:SKU:" in admin_stats("STATS:SKU")